@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from pathlib import Path
+import pygame
+
+# pygame < 2.1.3 only has the tostring/fromstring names
+_tobytes = getattr(pygame.image, 'tobytes', None) or pygame.image.tostring
+_frombytes = getattr(pygame.image, 'frombytes', None) or pygame.image.fromstring
+
+
+class AssetCache:
+    # pre-scaled images as raw RGBA and resolved font files, kept on disk between launches;
+    # a cache that cannot be written is only a slower start
+    def __init__(self, cacheDir):
+        self.cacheDir = Path(cacheDir)
+        self.hits = 0
+        self.misses = 0
+        self._indexPath = self.cacheDir / 'index.json'
+        try:
+            with open(self._indexPath) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = dict()
+        self.index.setdefault('images', dict())
+        self.index.setdefault('fonts', dict())
+        self._dirty = False
+
+    def scaled_image(self, path, size):
+        # the image at path scaled to size, decoded and scaled only when the source or the size changed
+        path = Path(path)
+        stat = path.stat()
+        width, height = int(size[0]), int(size[1])
+        key = f'{path.name}:{width}x{height}'
+        entry = self.index['images'].get(key)
+        if entry is not None and entry['mtime'] == stat.st_mtime_ns and entry['bytes'] == stat.st_size:
+            try:
+                with open(self.cacheDir / entry['file'], 'rb') as f:
+                    data = f.read()
+                self.hits += 1
+                return _frombytes(data, (width, height), 'RGBA')
+            except (OSError, ValueError):
+                pass
+        self.misses += 1
+        surface = pygame.transform.scale(pygame.image.load(str(path)), (width, height))
+        fileName = f'{path.stem}-{width}x{height}.rgba'
+        try:
+            self.cacheDir.mkdir(parents=True, exist_ok=True)
+            with open(self.cacheDir / fileName, 'wb') as f:
+                f.write(_tobytes(surface, 'RGBA'))
+        except OSError:
+            return surface
+        self.index['images'][key] = {'file' : fileName, 'mtime' : stat.st_mtime_ns, 'bytes' : stat.st_size}
+        self._dirty = True
+        return surface
+
+    def font_path(self, name):
+        # the font file SysFont would pick for name, None for pygame's default font;
+        # resolving it scans the system fonts, which can take seconds on a cold start
+        fonts = self.index['fonts']
+        if name in fonts and (fonts[name] is None or os.path.exists(fonts[name])):
+            self.hits += 1
+            return fonts[name]
+        self.misses += 1
+        fonts[name] = pygame.font.match_font(name)
+        self._dirty = True
+        return fonts[name]
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            self.cacheDir.mkdir(parents=True, exist_ok=True)
+            with open(self._indexPath, 'w') as f:
+                json.dump(self.index, f, indent=1)
+            self._dirty = False
+        except OSError:
+            pass
+
+
+class StartupTimer:
+    # wall time of the startup phases, from construction on
+    def __init__(self):
+        self.begin = time.perf_counter()
+        self._last = self.begin
+        self.phases = list()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000.0))
+        self._last = now
+
+    def total(self):
+        return (self._last - self.begin) * 1000.0
+
+    def report(self):
+        lines = [f'{phase:<12} {ms:8.1f} ms' for phase, ms in self.phases]
+        lines.append(f'{"total":<12} {self.total():8.1f} ms')
+        return '\n'.join(lines)
@@ -24,6 +24,8 @@ SPECIAL_CHARACTORS = (
 
 
 class Ball:
+    __slots__ = ('position', 'radius', 'velocity', 'charactor', 'moveUpDown', 'moveLeftRight', 'status', 'statusBeginTick', 'event')
+
     def __init__(self, position, radius, velocity, charactor):
         self.position = position
         self.radius = radius
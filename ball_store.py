@@ -0,0 +1,215 @@
+import heapq
+import numpy as np
+from ball import Charactor
+
+CHARACTOR_BY_CODE = {charactor.value : charactor for charactor in Charactor}
+
+
+class BallStore:
+    # structure-of-arrays storage for the non-hero balls, slots [0, size) are in use and
+    # dead slots below size are recycled through a free list, lowest first to keep the live range packed;
+    # size drops back to just past the last live slot whenever that slot dies
+    def __init__(self, capacity=256):
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.prevPositions = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocities = np.zeros((capacity, 2), dtype=np.float64)
+        self.radii = np.zeros(capacity, dtype=np.float64)
+        self.charactors = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # spawn order, slot order is not insertion order once slots are recycled
+        self.serials = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.count = 0
+        self.nextSerial = 0
+        self._free = list()
+        # bumped whenever slot indices are invalidated
+        self.generation = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.alive)
+
+    def clear(self):
+        self.alive[:] = False
+        self.size = 0
+        self.count = 0
+        self._free.clear()
+        self.generation += 1
+
+    def add(self, position, radius, velocity, charactor):
+        if self._free:
+            slot = heapq.heappop(self._free)
+        else:
+            if self.size == self.capacity:
+                self.grow(2 * self.capacity)
+            slot = self.size
+            self.size += 1
+        self.positions[slot] = position
+        self.prevPositions[slot] = position
+        self.velocities[slot] = velocity
+        self.radii[slot] = radius
+        self.charactors[slot] = charactor.value
+        self.alive[slot] = True
+        self.serials[slot] = self.nextSerial
+        self.nextSerial += 1
+        self.count += 1
+        return slot
+
+    def remove(self, mask):
+        # a mask taken before an earlier remove can be longer than size, its extra slots are dead
+        mask = mask[:self.size] & self.alive[:self.size]
+        slots = np.flatnonzero(mask)
+        self.alive[slots] = False
+        self.count -= len(slots)
+        for slot in slots.tolist():
+            heapq.heappush(self._free, slot)
+        # trim trailing dead slots so the active range shrinks again after a burst
+        if self.size > 0 and not self.alive[self.size - 1]:
+            live = np.flatnonzero(self.alive[:self.size])
+            self.size = int(live[-1]) + 1 if len(live) > 0 else 0
+            self._free = [slot for slot in self._free if slot < self.size]
+            heapq.heapify(self._free)
+        return len(slots)
+
+    def grow(self, capacity):
+        for name in ('positions', 'prevPositions', 'velocities', 'radii', 'charactors', 'alive', 'serials'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def copy_from(self, store):
+        # the live balls of store packed into [0, count), reusing this store's arrays
+        slots = store.alive_slots()
+        n = len(slots)
+        if n > self.capacity:
+            self.size = 0
+            self.grow(max(n, 2 * self.capacity))
+        for name in ('positions', 'prevPositions', 'velocities', 'radii', 'charactors', 'serials'):
+            np.take(getattr(store, name), slots, axis=0, out=getattr(self, name)[:n])
+        self.alive[:n] = True
+        self.alive[n:self.size] = False
+        self.size = n
+        self.count = n
+        self._free.clear()
+        self.generation += 1
+
+    def alive_slots(self):
+        return np.flatnonzero(self.alive[:self.size])
+
+    def spawn_order(self, slots):
+        # slots sorted by the order their balls were added
+        if len(slots) < 2:
+            return slots
+        return slots[np.argsort(self.serials[slots], kind='stable')]
+
+    def move(self, scale=1.0):
+        n = self.size
+        self.prevPositions[:n] = self.positions[:n]
+        if scale == 1.0:
+            self.positions[:n] += self.velocities[:n]
+        else:
+            self.positions[:n] += self.velocities[:n] * scale
+
+    def interpolated_positions(self, slots, alpha):
+        # positions between the last two ticks, 0.0 is the previous tick and 1.0 the current one
+        positions = self.positions[slots]
+        if alpha >= 1.0:
+            return positions
+        prevPositions = self.prevPositions[slots]
+        return prevPositions + (positions - prevPositions) * alpha
+
+    def outside_mask(self, panel):
+        # balls fully outside the panel and still moving away from it
+        n = self.size
+        x, y = self.positions[:n, 0], self.positions[:n, 1]
+        vx, vy = self.velocities[:n, 0], self.velocities[:n, 1]
+        r = self.radii[:n]
+        mask = (x + r < panel.left) & (vx < 0.0)
+        mask |= (x - r > panel.right) & (vx > 0.0)
+        mask |= (y + r < panel.top) & (vy < 0.0)
+        mask |= (y - r > panel.bottom) & (vy > 0.0)
+        mask &= self.alive[:n]
+        return mask
+
+    def max_radius(self):
+        if self.count == 0:
+            return 0.0
+        return float(self.radii[:self.size][self.alive[:self.size]].max())
+
+    def max_move(self):
+        # longest distance a live ball went from prevPositions to positions, the path sweep_mask tests;
+        # velocities can have changed since the move, a bounce for one
+        if self.count == 0:
+            return 0.0
+        alive = self.alive[:self.size]
+        moves = self.positions[:self.size][alive] - self.prevPositions[:self.size][alive]
+        return float(np.hypot(moves[:, 0], moves[:, 1]).max())
+
+    def collide_mask(self, position, radius, slots=None):
+        n = self.size
+        if slots is None:
+            dx = self.positions[:n, 0] - position[0]
+            dy = self.positions[:n, 1] - position[1]
+            reach = self.radii[:n] + radius
+            return (dx * dx + dy * dy < reach * reach) & self.alive[:n]
+        # narrow phase restricted to broad phase candidates
+        mask = np.zeros(n, dtype=bool)
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) > 0:
+            dx = self.positions[slots, 0] - position[0]
+            dy = self.positions[slots, 1] - position[1]
+            reach = self.radii[slots] + radius
+            mask[slots] = (dx * dx + dy * dy < reach * reach) & self.alive[slots]
+        return mask
+
+    def sweep_mask(self, start, end, radius, slots=None):
+        # continuous test over the last move, the balls go from prevPositions to positions while the
+        # other circle goes from start to end, both in straight lines; hits at the closest approach
+        n = self.size
+        mask = np.zeros(n, dtype=bool)
+        if slots is None:
+            slots = slice(0, n)
+        else:
+            slots = np.asarray(slots, dtype=np.int64)
+            if len(slots) == 0:
+                return mask
+        prev = self.prevPositions[slots]
+        positions = self.positions[slots]
+        px = prev[:, 0] - start[0]
+        py = prev[:, 1] - start[1]
+        ux = positions[:, 0] - prev[:, 0] - (end[0] - start[0])
+        uy = positions[:, 1] - prev[:, 1] - (end[1] - start[1])
+        uu = ux * ux + uy * uy
+        t = np.clip(-(px * ux + py * uy) / np.where(uu > 0.0, uu, 1.0), 0.0, 1.0)
+        dx = px + t * ux
+        dy = py + t * uy
+        reach = self.radii[slots] + radius
+        hit = dx * dx + dy * dy < reach * reach
+        # the end positions as well, so rounding never loses an overlap the discrete test would find
+        ex = positions[:, 0] - end[0]
+        ey = positions[:, 1] - end[1]
+        hit |= ex * ex + ey * ey < reach * reach
+        mask[slots] = hit & self.alive[slots]
+        return mask
+
+    def bounce(self, first, second):
+        # elastic response for overlapping, approaching pairs, mass taken as radius squared
+        d = self.positions[second] - self.positions[first]
+        dist2 = np.einsum('ij,ij->i', d, d)
+        reach = self.radii[first] + self.radii[second]
+        dv = self.velocities[second] - self.velocities[first]
+        approach = np.einsum('ij,ij->i', dv, d)
+        hit = (dist2 < reach * reach) & (dist2 > 0.0) & (approach < 0.0) & self.alive[first] & self.alive[second]
+        if not hit.any():
+            return 0
+        first, second, d = first[hit], second[hit], d[hit]
+        m1 = self.radii[first] ** 2
+        m2 = self.radii[second] ** 2
+        impulse = 2.0 * approach[hit] / (dist2[hit] * (m1 + m2))
+        np.add.at(self.velocities, first, (impulse * m2)[:, None] * d)
+        np.add.at(self.velocities, second, -(impulse * m1)[:, None] * d)
+        return len(first)
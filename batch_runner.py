@@ -0,0 +1,169 @@
+# headless game-balance sweeps over a multiprocessing pool, one seed per task
+#   python3 batch_runner.py --games 1000 --policies random_walk dodge -o results.jsonl --summary summary.json
+#   python3 batch_runner.py --configs configs.json ...
+# configs.json is a list of {"name": ..., "overrides": {"_collideScoreCoef": {"ENEMY": 6}, ...}}
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+import numpy as np
+from ball import Charactor
+from simulation import Simulation
+from score_store import ScoreStore, result_row
+
+
+def idle_policy(sim, rng):
+    return 0, 0
+
+
+def random_walk_policy(sim, rng, turnProb=0.05):
+    # keep a direction for a while, turn with probability turnProb per tick
+    hero = sim.heroBall
+    if rng.random() < turnProb:
+        return rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1))
+    return hero.moveUpDown, hero.moveLeftRight
+
+
+def dodge_policy(sim, rng, dangerDistance=120.0):
+    # run away from the nearest enemy when it gets close, otherwise chase the nearest special ball
+    store = sim.otherBalls
+    hero = sim.heroBall
+    slots = store.alive_slots()
+    if len(slots) == 0:
+        return random_walk_policy(sim, rng)
+    offsets = store.positions[slots] - hero.position
+    distances = np.hypot(offsets[:, 0], offsets[:, 1]) - store.radii[slots] - hero.radius
+    isEnemy = store.charactors[slots] == Charactor.ENEMY.value
+    if isEnemy.any() and distances[isEnemy].min() < dangerDistance:
+        k = np.flatnonzero(isEnemy)[np.argmin(distances[isEnemy])]
+        return -int(np.sign(offsets[k, 1])), -int(np.sign(offsets[k, 0]))
+    if (~isEnemy).any():
+        k = np.flatnonzero(~isEnemy)[np.argmin(distances[~isEnemy])]
+        return int(np.sign(offsets[k, 1])), int(np.sign(offsets[k, 0]))
+    return 0, 0
+
+
+POLICIES = {
+    'idle' : idle_policy,
+    'random_walk' : random_walk_policy,
+    'dodge' : dodge_policy,
+}
+
+
+def run_game(task):
+    # task: (configName, overrides, seed, policyName, maxTicks), returns one result row
+    configName, overrides, seed, policyName, maxTicks = task
+    sim = Simulation(seed=seed)
+    sim.apply_config(overrides)
+    sim.reset()
+    policy = POLICIES[policyName]
+    # the policy has its own stream so it never perturbs the game rng
+    policyRng = random.Random(seed ^ 0x5eed)
+    begin = time.perf_counter()
+    while sim.running and sim.tick < maxTicks:
+        sim.set_hero_move(*policy(sim, policyRng))
+        sim.step()
+    return {
+        'config' : configName,
+        'db' : result_row(sim, 'batch', policyName),
+        'configHash' : sim.config_hash(),
+        'policy' : policyName,
+        'seed' : seed,
+        'level' : sim.gameLevel,
+        'score' : sim.score,
+        'ticks' : sim.tick,
+        'survivalMs' : sim.get_ticks(),
+        'gameOver' : not sim.running,
+        'collisions' : {charactor.name : count for charactor, count in sim.collideCount.items()},
+        'wallSeconds' : time.perf_counter() - begin,
+    }
+
+
+def summarize(rows):
+    groups = dict()
+    for row in rows:
+        groups.setdefault((row['config'], row['policy']), list()).append(row)
+    summary = list()
+    for (configName, policyName), group in sorted(groups.items()):
+        entry = {
+            'config' : configName,
+            'configHash' : group[0]['configHash'],
+            'policy' : policyName,
+            'games' : len(group),
+            'gameOverRate' : sum(row['gameOver'] for row in group) / len(group),
+        }
+        for key in ('score', 'level', 'ticks'):
+            values = np.array([row[key] for row in group], dtype=np.float64)
+            entry[key] = {
+                'mean' : float(values.mean()),
+                'std' : float(values.std()),
+                'p10' : float(np.percentile(values, 10)),
+                'p50' : float(np.percentile(values, 50)),
+                'p90' : float(np.percentile(values, 90)),
+            }
+        entry['collisionsPerGame'] = {name : sum(row['collisions'][name] for row in group) / len(group) for name in group[0]['collisions']}
+        summary.append(entry)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run many headless games and aggregate the results')
+    parser.add_argument('--configs', default=None, help='JSON list of {"name", "overrides"}, the default config otherwise')
+    parser.add_argument('--games', type=int, default=100, help='games per config and policy')
+    parser.add_argument('--seed', type=int, default=0, help='first seed, game k uses seed + k')
+    parser.add_argument('--policies', nargs='+', default=['random_walk'], choices=sorted(POLICIES))
+    parser.add_argument('--max-ticks', type=int, default=24 * 60 * 10, help='stop games still running after this many ticks')
+    parser.add_argument('--processes', type=int, default=None, help='pool size, all cores by default')
+    parser.add_argument('--chunksize', type=int, default=8)
+    parser.add_argument('-o', '--output', default='results.jsonl', help='per-game results, one JSON object per line')
+    parser.add_argument('--summary', default='summary.json')
+    parser.add_argument('--db', default=None, help='also append every game to this score database')
+    args = parser.parse_args()
+
+    if args.configs is not None:
+        with open(args.configs) as f:
+            configs = [(config['name'], config.get('overrides', dict())) for config in json.load(f)]
+    else:
+        configs = [('default', dict())]
+    tasks = [(name, overrides, args.seed + k, policy, args.max_ticks)
+             for name, overrides in configs
+             for policy in args.policies
+             for k in range(args.games)]
+
+    rows = list()
+    store = ScoreStore(args.db) if args.db is not None else None
+    begin = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool, open(args.output, 'w') as out:
+        for i, row in enumerate(pool.imap_unordered(run_game, tasks, chunksize=args.chunksize), 1):
+            dbRow = row.pop('db')
+            if store is not None:
+                store.add(dbRow)
+            # stream each result as soon as it is done
+            print(json.dumps(row), file=out, flush=(i % 100 == 0))
+            rows.append(row)
+            if i % max(1, len(tasks) // 20) == 0:
+                print(f'{i}/{len(tasks)} games', file=sys.stderr)
+    if store is not None:
+        store.close()
+    elapsed = time.perf_counter() - begin
+
+    summary = summarize(rows)
+    with open(args.summary, 'w') as f:
+        json.dump({
+            'games' : len(rows),
+            'wallSeconds' : elapsed,
+            'simulatedTicks' : sum(row['ticks'] for row in rows),
+            'configs' : {name : overrides for name, overrides in configs},
+            'groups' : summary,
+        }, f, indent=2)
+    ticks = sum(row['ticks'] for row in rows)
+    print(f'{len(rows)} games, {ticks} ticks in {elapsed:.1f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s)')
+    for entry in summary:
+        print(f'{entry["config"]:<16} {entry["policy"]:<12} score {entry["score"]["mean"]:8.1f}  level {entry["level"]["mean"]:5.2f}  ticks {entry["ticks"]["p50"]:8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# scenario benchmark of the frame loop, per-phase timings as JSON
+#   python3 benchmarks/frame_loop.py -o bench.json
+#   python3 benchmarks/frame_loop.py --baseline bench.json      compare against a saved run
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, K_LEFT, K_UP
+from ball import Charactor
+from the_ball_app import App
+
+PHASES = ('on_event', 'on_loop', 'render_playground', 'render_scoreboard')
+PERCENTILES = (50, 95, 99)
+
+
+class Scenario:
+    def __init__(self, name, balls=None, status=None, level=1, warmupTicks=240):
+        # balls: number of balls kept on the field, None lets the game spawn on its own
+        # and runs warmupTicks untimed ticks first to reach a steady state
+        self.name = name
+        self.balls = balls
+        self.status = status
+        self.level = level
+        self.warmupTicks = warmupTicks
+
+    def setup(self, app):
+        sim = app.sim
+        for _ in range(self.level - 1):
+            sim.levelUp()
+        if self.status is not None:
+            sim.collid_handler(self.status)
+        self.top_up(app)
+        if self.balls is None:
+            for _ in range(self.warmupTicks):
+                sim.step()
+                self.keep_alive(app)
+
+    def keep_alive(self, app):
+        # collisions and status expiry must not change the workload under measurement
+        sim = app.sim
+        sim.running = True
+        app._running = True
+        if self.status is not None and sim.heroBall.status != self.status:
+            sim.collid_handler(self.status)
+
+    def top_up(self, app):
+        if self.balls is None:
+            return
+        sim = app.sim
+        panel = sim._playGroundPanel
+        missing = self.balls - len(sim.otherBalls)
+        for _ in range(missing):
+            slot = sim.generate_ball(Charactor.ENEMY)
+            sim.otherBalls.positions[slot] = (sim.rng.uniform(panel.left, panel.right), sim.rng.uniform(panel.top, panel.bottom))
+            sim.otherBalls.prevPositions[slot] = sim.otherBalls.positions[slot]
+
+
+SCENARIOS = [
+    Scenario('empty', balls=0),
+    Scenario('balls100', balls=100),
+    Scenario('balls1000', balls=1000),
+    Scenario('balls10000', balls=10000),
+    Scenario('godlike', balls=1000, status=Charactor.SPECIAL_GODLIKE),
+    Scenario('frozen', balls=1000, status=Charactor.SPECIAL_FROZEN),
+] + [Scenario(f'level{level}', level=level) for level in range(1, 31)]
+
+
+def timed(func):
+    begin = time.perf_counter()
+    func()
+    return time.perf_counter() - begin
+
+
+def run_scenario(scenario, frames, warmup, seed):
+    app = App(seed=seed)
+    app.on_init()
+    scenario.setup(app)
+    samples = {phase : list() for phase in PHASES}
+    keys = (K_LEFT, K_UP)
+    for frame in range(warmup + frames):
+        # alternate key presses so on_event has work every frame
+        key = keys[frame % len(keys)]
+        pygame.event.post(pygame.event.Event(KEYDOWN if frame % 4 < 2 else KEYUP, key=key))
+
+        def events():
+            for event in pygame.event.get():
+                app.on_event(event)
+
+        elapsed = (timed(events), timed(app.on_loop), timed(app.render_playground), timed(app.render_scoreboard))
+        pygame.display.update()
+        scenario.keep_alive(app)
+        scenario.top_up(app)
+        if frame >= warmup:
+            for phase, seconds in zip(PHASES, elapsed):
+                samples[phase].append(seconds * 1000.0)
+    result = dict()
+    for phase in PHASES:
+        values = np.array(samples[phase])
+        result[phase] = {f'p{q}' : float(np.percentile(values, q)) for q in PERCENTILES}
+        result[phase]['mean'] = float(values.mean())
+    result['balls'] = len(app.sim.otherBalls)
+    app.on_cleanup()
+    return result
+
+
+def compare(current, baseline, threshold):
+    # returns the list of (scenario, phase, stat, ratio) regressions beyond threshold
+    regressions = list()
+    print(f'{"scenario":<12} {"phase":<18} {"p50 ms":>9} {"base":>9} {"ratio":>7} {"p95 ms":>9} {"base":>9} {"ratio":>7}')
+    for name, phases in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for phase in PHASES:
+            row = f'{name:<12} {phase:<18}'
+            for stat in ('p50', 'p95'):
+                now = phases[phase][stat]
+                before = base[phase][stat]
+                ratio = now / before if before > 0.0 else float('inf')
+                mark = '!' if ratio > 1.0 + threshold else ' '
+                row += f' {now:>9.3f} {before:>9.3f} {ratio:>6.2f}{mark}'
+                if ratio > 1.0 + threshold:
+                    regressions.append((name, phase, stat, ratio))
+            print(row)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', nargs='+', default=None, help=f'subset of: {" ".join(s.name for s in SCENARIOS)}')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help='write the JSON result to this file')
+    parser.add_argument('--baseline', default=None, help='compare against a saved JSON result')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.scenarios is not None:
+        byName = {scenario.name : scenario for scenario in SCENARIOS}
+        scenarios = [byName[name] for name in args.scenarios]
+
+    result = {
+        'meta' : {
+            'python' : platform.python_version(),
+            'pygame' : pygame.version.ver,
+            'numpy' : np.__version__,
+            'machine' : platform.machine(),
+            'frames' : args.frames,
+            'seed' : args.seed,
+        },
+        'scenarios' : dict(),
+    }
+    for scenario in scenarios:
+        result['scenarios'][scenario.name] = run_scenario(scenario, args.frames, args.warmup, args.seed)
+        print(f'{scenario.name}: ' + ', '.join(f'{phase} {result["scenarios"][scenario.name][phase]["p50"]:.3f}ms' for phase in PHASES), file=sys.stderr)
+
+    text = json.dumps(result, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    elif args.baseline is None:
+        print(text)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions beyond {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
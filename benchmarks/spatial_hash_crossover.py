@@ -0,0 +1,116 @@
+# microbenchmark: linear scan vs uniform grid for hero collision and ball-vs-ball pairs
+#   python3 benchmarks/spatial_hash_crossover.py [--repeat 20]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ball import Charactor
+from ball_store import BallStore
+from panel import Panel
+from simulation import Simulation
+from spatial_hash import SpatialHash
+
+
+def make_store(panel, n, rng):
+    store = BallStore(max(16, n))
+    for _ in range(n):
+        theta = rng.uniform(0.0, 2.0 * np.pi)
+        speed = rng.uniform(4, 8)
+        store.add((rng.uniform(panel.left, panel.right), rng.uniform(panel.top, panel.bottom)),
+                  rng.uniform(5, 10),
+                  (speed * np.cos(theta), speed * np.sin(theta)),
+                  Charactor.ENEMY)
+    return store
+
+
+def advance(store, panel):
+    # keep the field populated: move and wrap around instead of culling
+    n = store.size
+    store.move()
+    store.positions[:n, 0] = panel.left + np.mod(store.positions[:n, 0] - panel.left, panel.width)
+    store.positions[:n, 1] = panel.top + np.mod(store.positions[:n, 1] - panel.top, panel.height)
+
+
+def brute_pairs(store, chunk=512):
+    n = store.size
+    first = list()
+    second = list()
+    for begin in range(0, n, chunk):
+        rows = np.arange(begin, min(n, begin + chunk))
+        d = store.positions[None, :n, :] - store.positions[rows, None, :]
+        dist2 = np.einsum('ijk,ijk->ij', d, d)
+        reach = store.radii[rows, None] + store.radii[None, :n]
+        hit = (dist2 < reach * reach) & (np.arange(n)[None, :] > rows[:, None])
+        i, j = np.nonzero(hit)
+        first.append(rows[i])
+        second.append(j)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def timed(func, repeat):
+    samples = list()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - begin)
+    return float(np.median(samples)) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 30, 100, 300, 1000, 3000, 10000])
+    parser.add_argument('--cell', type=float, default=Simulation()._gridCellSize, help="grid cell size, the game's by default")
+    args = parser.parse_args()
+
+    panel = Panel(0, 0, 1024, 720)
+    hero = (512.0, 360.0)
+    heroRadius = 16
+    rng = np.random.default_rng(0)
+
+    print(f'{"balls":>7} {"hero scan":>10} {"hero grid":>10} {"pair brute":>11} {"pair grid":>10}   (ms per frame, median)')
+    heroCrossover = None
+    pairCrossover = None
+    for n in args.sizes:
+        store = make_store(panel, n, rng)
+        grid = SpatialHash(panel, args.cell)
+
+        def hero_scan():
+            advance(store, panel)
+            store.collide_mask(hero, heroRadius)
+
+        def hero_grid():
+            advance(store, panel)
+            grid.sync(store)
+            store.collide_mask(hero, heroRadius, grid.query(*hero, heroRadius + store.max_radius()))
+
+        def pair_brute():
+            advance(store, panel)
+            store.bounce(*brute_pairs(store))
+
+        def pair_grid():
+            advance(store, panel)
+            grid.sync(store)
+            store.bounce(*grid.candidate_pairs(2.0 * store.max_radius()))
+
+        heroScan = timed(hero_scan, args.repeat)
+        heroGrid = timed(hero_grid, args.repeat)
+        pairBrute = timed(pair_brute, max(1, args.repeat // 4))
+        pairGrid = timed(pair_grid, args.repeat)
+        if heroCrossover is None and heroGrid < heroScan:
+            heroCrossover = n
+        if pairCrossover is None and pairGrid < pairBrute:
+            pairCrossover = n
+        print(f'{n:>7} {heroScan:>10.3f} {heroGrid:>10.3f} {pairBrute:>11.3f} {pairGrid:>10.3f}')
+
+    print(f'hero collision: grid beats scan from {heroCrossover} balls' if heroCrossover else 'hero collision: scan wins at every size')
+    print(f'ball-vs-ball: grid beats brute force from {pairCrossover} balls' if pairCrossover else 'ball-vs-ball: brute force wins at every size')
+
+
+if __name__ == '__main__':
+    main()
@@ -37,4 +37,6 @@ BALL_COLOR_DICT = {
     Charactor.SPECIAL_BIGGER : SPECIAL_BIGGER_COLOR,
     Charactor.SPECIAL_GODLIKE : SPECIAL_GODLIKE_COLOR,
     Charactor.SPECIAL_FROZEN : SPECIAL_FROZEN_COLOR,
-}
\ No newline at end of file
+}
+
+BALL_COLOR_BY_CODE = {charactor.value : color for charactor, color in BALL_COLOR_DICT.items()}
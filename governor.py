@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class QualityTier:
+    def __init__(self, name, antialias, hudInterval, renderScale, lod):
+        self.name = name
+        self.antialias = antialias # allowed, App._antialias still decides
+        self.hudInterval = hudInterval # frames between scoreboard refreshes
+        self.renderScale = renderScale # playground resolution relative to the window
+        self.lod = lod # cull off-playground balls, draw tiny ones as dots
+
+
+# from the best looking to the lowest quality, each tier keeps the settings of the ones before it;
+# which tiers are actually cheaper depends on the render mode, see effective_tiers
+TIERS = (
+    QualityTier('high', True, 1, 1.0, False),
+    QualityTier('no AA', False, 1, 1.0, False),
+    QualityTier('HUD 1/6', False, 6, 1.0, False),
+    QualityTier('half res', False, 6, 0.5, False),
+    QualityTier('LOD', False, 6, 0.5, True),
+)
+
+
+def effective_tiers(tiers, antialias, dirtyRects=False):
+    # tiers without the ones that would draw exactly like the tier before them once antialias is applied,
+    # stepping to one of those only costs a window of frames over budget; with dirtyRects the lower
+    # resolution tiers are left out too, they redraw the whole playground every frame while dirty rects
+    # only update what changed
+    result = list()
+    last = None
+    for tier in tiers:
+        if dirtyRects and tier.renderScale < 1.0:
+            continue
+        effect = (antialias and tier.antialias, tier.hudInterval, tier.renderScale, tier.lod)
+        if effect != last:
+            result.append(tier)
+        last = effect
+    return tuple(result)
+
+
+class QualityGovernor:
+    # steps down a tier when the rolling frame cost nears the budget and back up when there is headroom;
+    # the thresholds are apart and every change waits for a full window of new frames, a step up that
+    # has to be undone right away doubles the wait before the next one
+    def __init__(self, budget, window=60, downRatio=0.9, upRatio=0.5, tiers=TIERS):
+        self.budget = budget # ms of work per frame
+        self.downRatio = downRatio
+        self.upRatio = upRatio
+        self.tiers = tiers
+        self.tier = 0
+        self.changes = 0
+        self._costs = np.zeros(window, dtype=np.float64)
+        self._count = 0
+        self._framesAtTier = 0
+        self._upHold = window
+        self._lastStepUp = False
+
+    @property
+    def quality(self):
+        return self.tiers[self.tier]
+
+    def rolling_cost(self):
+        n = min(self._count, len(self._costs))
+        return float(self._costs[:n].mean()) if n > 0 else 0.0
+
+    def update(self, cost):
+        # cost: ms the last frame took without waiting for the clock, returns True when the tier changed
+        window = len(self._costs)
+        self._costs[self._count % window] = cost
+        self._count += 1
+        self._framesAtTier += 1
+        if self._count < window:
+            return False
+        rollingCost = self.rolling_cost()
+        if rollingCost > self.downRatio * self.budget and self.tier < len(self.tiers) - 1:
+            if self._lastStepUp and self._framesAtTier < 2 * window:
+                self._upHold = min(2 * self._upHold, 32 * window)
+            self.tier += 1
+            self._lastStepUp = False
+        elif rollingCost < self.upRatio * self.budget and self.tier > 0 and self._framesAtTier >= self._upHold:
+            self.tier -= 1
+            self._lastStepUp = True
+        else:
+            if self._lastStepUp and self._framesAtTier >= 2 * window:
+                # the last step up held
+                self._upHold = window
+            return False
+        self.changes += 1
+        self._count = 0
+        self._framesAtTier = 0
+        return True
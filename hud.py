@@ -0,0 +1,67 @@
+from collections import OrderedDict
+import pygame
+import colors
+
+class TextCache:
+    # fonts are loaded once, rendered text surfaces are kept in a bounded LRU
+    def __init__(self, maxSurfaces=256, fontResolver=None):
+        # fontResolver: name -> font file path or None for the default font, SysFont otherwise
+        self.maxSurfaces = maxSurfaces
+        self.fontResolver = fontResolver
+        self.fonts = dict()
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, name, size):
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            if self.fontResolver is not None:
+                font = pygame.font.Font(self.fontResolver(name), size)
+            else:
+                font = pygame.font.SysFont(name, size)
+            self.fonts[key] = font
+        return key
+
+    def render(self, fontKey, text, color, antialias=False):
+        key = (fontKey, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.fonts[fontKey].render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxSurfaces:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class Label:
+    # a piece of text bound to a value, re-rasterized only when the value changes
+    _UNSET = object()
+
+    def __init__(self, textCache, fontKey, template, position, color=colors.BLACK):
+        self.textCache = textCache
+        self.fontKey = fontKey
+        self.template = template
+        self.position = tuple(position)
+        self.color = color
+        self.value = Label._UNSET
+        self.surface = None
+        self.rect = None
+        self.prevRect = None
+
+    def set(self, value=None):
+        if value == self.value and self.surface is not None:
+            return False
+        self.value = value
+        self.surface = self.textCache.render(self.fontKey, self.template.format(value), self.color)
+        self.prevRect = self.rect
+        self.rect = self.surface.get_rect(topleft=self.position)
+        return True
+
+    def draw(self, surface):
+        surface.blit(self.surface, self.position)
@@ -1,5 +1,3 @@
-from pygame import Rect
-
 class Panel:
     def __init__(self, left, top, width, height):
         self.left = left
@@ -13,4 +11,5 @@ class Panel:
         return [round(self.left + self.width * widthPercent), round(self.top + self.height * heightPercent)]
     
     def to_rect(self):
+        from pygame import Rect
         return Rect(self.left, self.top, self.width, self.height)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+from ball import Ball, Charactor
+from ball_store import BallStore
+from simulation import Simulation
+
+
+class FrameState:
+    # what the renderer reads of a Simulation, copied after a tick so the simulation can go on meanwhile;
+    # the arrays are reused from one capture to the next
+    def __init__(self, tickRate):
+        self._tickRate = tickRate
+        self.tick = 0
+        self.stamp = 0.0 # perf_counter time the tick was due
+        self.gameLevel = 1
+        self.score = 0.0
+        self.heroBall = Ball([0.0, 0.0], 0, 0, Charactor.HERO)
+        self.heroPrevPosition = [0.0, 0.0]
+        self.otherBalls = BallStore()
+
+    def capture(self, sim, stamp):
+        self.tick = sim.tick
+        self.stamp = stamp
+        self.gameLevel = sim.gameLevel
+        self.score = sim.score
+        hero = self.heroBall
+        simHero = sim.heroBall
+        hero.position[0], hero.position[1] = simHero.position
+        hero.radius = simHero.radius
+        hero.velocity = simHero.velocity
+        hero.status = simHero.status
+        hero.statusBeginTick = simHero.statusBeginTick
+        hero.event = simHero.event
+        self.heroPrevPosition[0], self.heroPrevPosition[1] = sim.heroPrevPosition
+        self.otherBalls.copy_from(sim.otherBalls)
+
+    get_ticks = Simulation.get_ticks
+    hero_interpolated_position = Simulation.hero_interpolated_position
+
+
+class TripleBuffer:
+    # one writer fills back() and publishes it, one reader takes the latest published buffer;
+    # neither ever waits for the other and the buffer the reader holds is never written
+    def __init__(self, make):
+        self._buffers = [make() for _ in range(3)]
+        self._back, self._ready, self._front = 0, 1, 2
+        self._fresh = False
+        self._lock = threading.Lock()
+
+    def back(self):
+        return self._buffers[self._back]
+
+    def publish(self):
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            self._fresh = True
+
+    def latest(self):
+        with self._lock:
+            if self._fresh:
+                self._front, self._ready = self._ready, self._front
+                self._fresh = False
+        return self._buffers[self._front]
@@ -0,0 +1,81 @@
+import argparse
+import time
+import numpy as np
+import pygame
+
+# ITU-R BT.601 luma weights in thousandths
+LUMA_WEIGHTS = (299, 587, 114)
+
+
+def luma(rgb):
+    # (height, width, 3) uint8 to (height, width) uint8, the reference the grayscale frames match
+    return ((rgb.astype(np.uint32) * np.array(LUMA_WEIGHTS, dtype=np.uint32)).sum(axis=2) // 1000).astype(np.uint8)
+
+
+class PixelObserver:
+    # renders the playground of an App offscreen into a numpy array, no window needed;
+    # the surface is built on top of the array's memory so frames are never copied out of it
+    def __init__(self, app, size=(256, 180), grayscale=False):
+        self.app = app
+        self.size = tuple(size)
+        self.grayscale = grayscale
+        width, height = self.size
+        self.rgb = np.zeros((height, width, 3), dtype=np.uint8)
+        self.surface = pygame.image.frombuffer(self.rgb, self.size, 'RGB')
+        if grayscale:
+            # drawn in color and converted with numpy, an 8-bit palette surface would map every
+            # blit through SDL's lossy 3-3-2 color table
+            self.frame = np.zeros((height, width), dtype=np.uint8)
+            self._luma = np.zeros((height, width), dtype=np.uint32)
+            self._channel = np.zeros((height, width), dtype=np.uint32)
+        else:
+            self.frame = self.rgb
+        if not hasattr(app, 'sprites'):
+            app.init_render_state()
+
+    def observe(self):
+        # (height, width, 3) uint8, or (height, width) for grayscale; the same array is
+        # overwritten by the next observe(), copy it to keep a frame
+        self.app.render_playground(self.surface)
+        if self.grayscale:
+            np.multiply(self.rgb[:, :, 0], LUMA_WEIGHTS[0], out=self._luma, dtype=np.uint32)
+            for channel in (1, 2):
+                np.multiply(self.rgb[:, :, channel], LUMA_WEIGHTS[channel], out=self._channel, dtype=np.uint32)
+                self._luma += self._channel
+            np.floor_divide(self._luma, 1000, out=self.frame, casting='unsafe')
+        return self.frame
+
+
+def main():
+    # renders a headless game both ways and checks the grayscale frames against the color ones
+    parser = argparse.ArgumentParser(description='check and time pixel observations of a headless game')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=256)
+    parser.add_argument('--height', type=int, default=180)
+    args = parser.parse_args()
+
+    from the_ball_app import App
+    app = App(seed=args.seed)
+    app.sim.reset()
+    color = PixelObserver(app, (args.width, args.height))
+    gray = PixelObserver(app, (args.width, args.height), grayscale=True)
+    colorSeconds = grayscaleSeconds = 0.0
+    for _ in range(args.frames):
+        app.sim.step()
+        # keep the game going, only the frames are checked
+        app.sim.running = True
+        begin = time.perf_counter()
+        rgb = color.observe()
+        colorSeconds += time.perf_counter() - begin
+        begin = time.perf_counter()
+        frame = gray.observe()
+        grayscaleSeconds += time.perf_counter() - begin
+        if not np.array_equal(frame, luma(rgb)):
+            raise SystemExit(f'grayscale frame differs from the luma of the color frame at tick {app.sim.tick}')
+    print(f'{args.frames} frames of {args.width}x{args.height}, {len(app.sim.otherBalls)} balls at the end, grayscale matches the color luma')
+    print(f'color {args.frames / colorSeconds:.0f} frames/s, grayscale {args.frames / grayscaleSeconds:.0f} frames/s')
+
+
+if __name__ == '__main__':
+    main()
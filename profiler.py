@@ -0,0 +1,92 @@
+import json
+import sys
+import time
+import numpy as np
+import pygame
+
+PHASES = ('event', 'loop', 'render_playground', 'render_scoreboard', 'display_update', 'idle')
+
+
+class FrameProfiler:
+    # per-frame phase timings in a fixed-size ring buffer, the game loop only calls into it while enabled
+    def __init__(self, capacity=600):
+        self.enabled = False
+        self.capacity = capacity
+        self.times = np.zeros((capacity, len(PHASES)), dtype=np.float64) # ms
+        self.ticks = np.zeros(capacity, dtype=np.int32)
+        self.balls = np.zeros(capacity, dtype=np.int32)
+        self.allocations = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+        self._phaseIndex = {phase : i for i, phase in enumerate(PHASES)}
+        self._row = None
+        self._lastMark = None
+        self._blocks = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def begin_frame(self):
+        self._row = self.count % self.capacity
+        self.times[self._row] = 0.0
+        self.ticks[self._row] = 0
+        self._blocks = sys.getallocatedblocks()
+        self._lastMark = time.perf_counter()
+
+    def mark(self, phase):
+        # time since the previous mark is charged to phase
+        now = time.perf_counter()
+        self.times[self._row, self._phaseIndex[phase]] += (now - self._lastMark) * 1000.0
+        self._lastMark = now
+
+    def end_frame(self, ticks, balls):
+        self.ticks[self._row] = ticks
+        self.balls[self._row] = balls
+        # net memory blocks allocated during the frame
+        self.allocations[self._row] = sys.getallocatedblocks() - self._blocks
+        self.count += 1
+
+    def ordered(self):
+        # row indices from the oldest to the newest recorded frame
+        n = len(self)
+        return (np.arange(n) + self.count - n) % self.capacity
+
+    def frame_times(self):
+        return self.times[self.ordered()].sum(axis=1)
+
+    def rows(self):
+        first = self.count - len(self)
+        for k, row in enumerate(self.ordered().tolist()):
+            yield dict(frame=first + k,
+                       **{phase : float(self.times[row, i]) for i, phase in enumerate(PHASES)},
+                       total=float(self.times[row].sum()),
+                       ticks=int(self.ticks[row]),
+                       balls=int(self.balls[row]),
+                       allocations=int(self.allocations[row]))
+
+    def dump(self, path):
+        path = str(path)
+        rows = list(self.rows())
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({'phases' : PHASES, 'frames' : rows}, f)
+        else:
+            columns = ('frame',) + PHASES + ('total', 'ticks', 'balls', 'allocations')
+            with open(path, 'w') as f:
+                print(','.join(columns), file=f)
+                for row in rows:
+                    print(','.join(str(row[column]) for column in columns), file=f)
+
+    def draw(self, surface, rect, budget, color=(0, 0, 0), budgetColor=(255, 0, 0)):
+        # frame-time graph of the newest frames, one pixel column per frame, budget drawn at half height
+        pygame.draw.rect(surface, (255, 255, 255), rect)
+        pygame.draw.line(surface, budgetColor, (rect.left, rect.centery), (rect.right - 1, rect.centery))
+        frameTimes = self.frame_times()[-rect.width:]
+        if len(frameTimes) < 2:
+            return
+        heights = np.minimum(frameTimes / (2.0 * budget), 1.0) * (rect.height - 1)
+        xs = rect.left + np.arange(len(frameTimes))
+        ys = rect.bottom - 1 - heights.astype(int)
+        pygame.draw.lines(surface, color, False, list(zip(xs.tolist(), ys.tolist())))
@@ -0,0 +1,149 @@
+# compact input replays: the game seed plus one key-state bitmask per simulation tick
+#   python3 replay.py game.replay           play back headless at full speed
+
+import argparse
+import struct
+import time
+from panel import Panel
+from simulation import Simulation
+
+KEY_UP      = 1
+KEY_DOWN    = 2
+KEY_LEFT    = 4
+KEY_RIGHT   = 8
+
+FLAG_BALL_COLLIDE_MODE = 1
+FLAG_CONTINUOUS_COLLISION = 2
+
+_MAGIC = b'TBRP'
+_VERSION = 2
+# magic, version, flags, tick rate, seed, tick count, playground left/top/width/height
+_HEADER = struct.Struct('<4sBBHQI4d')
+
+
+def key_mask(up, down, left, right):
+    return (KEY_UP if up else 0) | (KEY_DOWN if down else 0) | (KEY_LEFT if left else 0) | (KEY_RIGHT if right else 0)
+
+
+def mask_to_move(mask):
+    # (moveUpDown, moveLeftRight) as resolved from the keyboard in App.on_event
+    moveUpDown = (1 if mask & KEY_DOWN else 0) - (1 if mask & KEY_UP else 0)
+    moveLeftRight = (1 if mask & KEY_RIGHT else 0) - (1 if mask & KEY_LEFT else 0)
+    return moveUpDown, moveLeftRight
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class Replay:
+    def __init__(self, seed, tickRate, panel, flags=0, masks=None):
+        self.seed = seed
+        self.tickRate = tickRate
+        self.panel = panel
+        self.flags = flags
+        self.masks = masks if masks is not None else bytearray()
+
+    def __len__(self):
+        return len(self.masks)
+
+    @classmethod
+    def for_simulation(cls, sim):
+        flags = FLAG_BALL_COLLIDE_MODE if sim._ballCollideMode else 0
+        if sim._continuousCollision:
+            flags |= FLAG_CONTINUOUS_COLLISION
+        return cls(sim.seed, sim._tickRate, sim._playGroundPanel, flags)
+
+    def record(self, mask):
+        self.masks.append(mask)
+
+    def to_bytes(self):
+        # key states are run-length encoded as (mask, varint run length) pairs
+        out = bytearray(_HEADER.pack(_MAGIC, _VERSION, self.flags, self.tickRate, self.seed, len(self.masks),
+                                     self.panel.left, self.panel.top, self.panel.width, self.panel.height))
+        i = 0
+        n = len(self.masks)
+        while i < n:
+            mask = self.masks[i]
+            j = i + 1
+            while j < n and self.masks[j] == mask:
+                j += 1
+            out.append(mask)
+            _write_varint(out, j - i)
+            i = j
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, flags, tickRate, seed, tickCount, left, top, width, height = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError('not a replay file')
+        if version != _VERSION:
+            raise ValueError(f'unsupported replay version {version}')
+        masks = bytearray()
+        offset = _HEADER.size
+        while len(masks) < tickCount:
+            mask = data[offset]
+            run, offset = _read_varint(data, offset + 1)
+            masks.extend(bytes((mask,)) * run)
+        return cls(seed, tickRate, Panel(left, top, width, height), flags, masks)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def new_simulation(self):
+        sim = Simulation(self.panel, seed=self.seed)
+        sim._tickRate = self.tickRate
+        sim._ballCollideMode = bool(self.flags & FLAG_BALL_COLLIDE_MODE)
+        sim._continuousCollision = bool(self.flags & FLAG_CONTINUOUS_COLLISION)
+        sim.reset()
+        return sim
+
+    def play(self, sim=None):
+        # run the recorded inputs headless at full speed, returns the finished simulation
+        if sim is None:
+            sim = self.new_simulation()
+        for mask in self.masks:
+            if not sim.running:
+                break
+            sim.set_hero_move(*mask_to_move(mask))
+            sim.step()
+        return sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description='play back a replay headless')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    begin = time.perf_counter()
+    sim = replay.play()
+    elapsed = time.perf_counter() - begin
+    print(f'seed {replay.seed}, {len(replay)} ticks recorded, {sim.tick} played in {elapsed:.3f}s')
+    print(f'level {sim.gameLevel}, score {sim.score:.1f}, {"game over" if not sim.running else "still running"}')
+
+
+if __name__ == '__main__':
+    main()
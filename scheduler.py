@@ -0,0 +1,59 @@
+import heapq
+
+
+class TimerHandle:
+    __slots__ = ('tick', 'priority', 'seq', 'name', 'args', 'cancelled')
+
+    def __init__(self, tick, priority, seq, name, args):
+        self.tick = tick
+        self.priority = priority
+        self.seq = seq
+        self.name = name
+        self.args = args
+        self.cancelled = False
+
+
+class Scheduler:
+    # timers keyed on simulation ticks, due timers fire in (tick, priority, scheduling order);
+    # callbacks are method names of the owner so the pending timers are plain data
+    def __init__(self, owner):
+        self.owner = owner
+        self._heap = list()
+        self._seq = 0
+        self._cancelled = 0
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, tick, name, *args, priority=0):
+        handle = TimerHandle(tick, priority, self._seq, name, args)
+        self._seq += 1
+        heapq.heappush(self._heap, (tick, priority, handle.seq, handle))
+        return handle
+
+    def cancel(self, handle):
+        # cancelled timers stay in the heap until they surface or the heap is mostly dead
+        if handle is None or handle.cancelled:
+            return
+        handle.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > 64 and 2 * self._cancelled > len(self._heap):
+            self._heap = [entry for entry in self._heap if not entry[3].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def run(self, tick):
+        # fire every timer due at or before tick, including ones scheduled by the callbacks
+        heap = self._heap
+        while heap and heap[0][0] <= tick:
+            handle = heapq.heappop(heap)[3]
+            if handle.cancelled:
+                self._cancelled -= 1
+                continue
+            # a fired handle counts as done, cancelling it later is a no-op
+            handle.cancelled = True
+            getattr(self.owner, handle.name)(*handle.args)
+
+    def pending(self):
+        # (tick, priority, name, args) of the live timers in firing order
+        return [(handle.tick, handle.priority, handle.name, handle.args) for _, _, _, handle in sorted(self._heap) if not handle.cancelled]
@@ -0,0 +1,185 @@
+# every finished game in a local SQLite database, shared by the game and the batch runner
+#   python3 score_store.py scores.sqlite3 --top 10
+#   python3 score_store.py scores.sqlite3 --config 3f2a9c1b7d4e --percentiles 10 50 90 99
+#   python3 score_store.py scores.sqlite3 --per-config
+
+import argparse
+import queue
+import sqlite3
+import threading
+import time
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    finishedAt REAL NOT NULL,
+    level INTEGER NOT NULL,
+    score REAL NOT NULL,
+    durationMs INTEGER,
+    ticks INTEGER,
+    seed INTEGER,
+    configHash TEXT,
+    policy TEXT,
+    gameOver INTEGER,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_score ON runs (score);
+CREATE INDEX IF NOT EXISTS runs_config_score ON runs (configHash, score);
+-- the player's best and the record.dat check at startup seek this instead of scanning past batch runs
+CREATE INDEX IF NOT EXISTS runs_source_score ON runs (source, score);
+'''
+_COLUMNS = ('finishedAt', 'level', 'score', 'durationMs', 'ticks', 'seed', 'configHash', 'policy', 'gameOver', 'source')
+_INSERT = f'INSERT INTO runs ({", ".join(_COLUMNS)}) VALUES ({", ".join("?" * len(_COLUMNS))})'
+_STOP = object()
+# games a person played, batch runs and other bots use their own source
+PLAYER_SOURCES = ('game', 'record.dat')
+
+
+def _connect(path):
+    connection = sqlite3.connect(str(path), timeout=30.0)
+    # WAL: readers never block the writer, a crash loses at most the transaction in flight
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+def result_row(sim, source, policy=None):
+    # the columns of a finished Simulation
+    return {
+        'finishedAt' : time.time(),
+        'level' : sim.gameLevel,
+        'score' : sim.score,
+        'durationMs' : sim.get_ticks(),
+        'ticks' : sim.tick,
+        'seed' : sim.seed,
+        'configHash' : sim.config_hash(),
+        'policy' : policy,
+        'gameOver' : not sim.running,
+        'source' : source,
+    }
+
+
+class ScoreStore:
+    # add() only queues the row, a writer thread inserts queued rows in batches of one transaction each;
+    # queries run on the calling thread with their own connection
+    def __init__(self, path, batchSize=1000):
+        self.path = path
+        self.batchSize = batchSize
+        self._connection = _connect(path)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='score-store', daemon=True)
+        self._writer.start()
+
+    def add(self, row):
+        self._queue.put(tuple(row.get(column) for column in _COLUMNS))
+
+    def flush(self):
+        # wait until every added row is committed
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._connection.close()
+
+    def _write_loop(self):
+        connection = _connect(self.path)
+        try:
+            stop = False
+            while not stop:
+                rows = [self._queue.get()]
+                while len(rows) < self.batchSize:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _STOP in rows
+                with connection:
+                    connection.executemany(_INSERT, [row for row in rows if row is not _STOP])
+                for _ in rows:
+                    self._queue.task_done()
+        finally:
+            connection.close()
+
+    def migrate_record(self, path):
+        # imports the single best result of the old record.dat once
+        if self._connection.execute("SELECT 1 FROM runs WHERE source = 'record.dat' LIMIT 1").fetchone() is not None:
+            return False
+        try:
+            with open(path) as f:
+                level = int(next(f))
+                score = float(next(f))
+        except (OSError, StopIteration, ValueError):
+            return False
+        with self._connection:
+            self._connection.execute(_INSERT, (time.time(), level, score, None, None, None, None, None, None, 'record.dat'))
+        return True
+
+    def _where(self, configHash, sources=None):
+        conditions, args = list(), tuple()
+        if configHash is not None:
+            conditions.append('configHash = ?')
+            args += (configHash,)
+        if sources is not None:
+            conditions.append(f'source IN ({", ".join("?" * len(sources))})')
+            args += tuple(sources)
+        if not conditions:
+            return '', ()
+        return ' WHERE ' + ' AND '.join(conditions), args
+
+    def count(self, configHash=None):
+        where, args = self._where(configHash)
+        return self._connection.execute(f'SELECT COUNT(*) FROM runs{where}', args).fetchone()[0]
+
+    def best(self, configHash=None, sources=None):
+        # (level, score) of the highest score, None before the first game; sources limits it to those sources
+        where, args = self._where(configHash, sources)
+        return self._connection.execute(f'SELECT level, score FROM runs{where} ORDER BY score DESC LIMIT 1', args).fetchone()
+
+    def top(self, n=10, configHash=None):
+        where, args = self._where(configHash)
+        cursor = self._connection.execute(f'SELECT {", ".join(_COLUMNS)} FROM runs{where} ORDER BY score DESC LIMIT ?', args + (n,))
+        return [dict(zip(_COLUMNS, row)) for row in cursor]
+
+    def percentiles(self, qs, configHash=None):
+        # nearest-rank score percentiles, each one walks the score index up to its rank
+        n = self.count(configHash)
+        if n == 0:
+            return {q : None for q in qs}
+        where, args = self._where(configHash)
+        result = dict()
+        for q in qs:
+            rank = min(n - 1, max(0, round(q / 100.0 * (n - 1))))
+            result[q] = self._connection.execute(f'SELECT score FROM runs{where} ORDER BY score LIMIT 1 OFFSET ?', args + (rank,)).fetchone()[0]
+        return result
+
+    def per_config(self):
+        cursor = self._connection.execute('SELECT configHash, COUNT(*), AVG(score), MAX(score), AVG(level), MAX(level) FROM runs GROUP BY configHash ORDER BY configHash')
+        return [dict(zip(('configHash', 'games', 'meanScore', 'maxScore', 'meanLevel', 'maxLevel'), row)) for row in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='query a score database')
+    parser.add_argument('path')
+    parser.add_argument('--config', default=None, help='only games with this config hash')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--percentiles', type=float, nargs='*', default=(10, 50, 90, 99))
+    parser.add_argument('--per-config', action='store_true')
+    args = parser.parse_args()
+
+    store = ScoreStore(args.path)
+    print(f'{store.count(args.config)} games')
+    for i, row in enumerate(store.top(args.top, args.config), 1):
+        print(f'{i:>3} score {row["score"]:10.1f}  level {row["level"]:3}  seed {row["seed"]}  config {row["configHash"]}  {row["source"]}')
+    for q, score in store.percentiles(args.percentiles, args.config).items():
+        print(f'p{q:g} {score}')
+    if args.per_config:
+        for entry in store.per_config():
+            print(f'{entry["configHash"]}  {entry["games"]:>8} games  score mean {entry["meanScore"]:8.1f} max {entry["maxScore"]:8.1f}  level mean {entry["meanLevel"]:5.2f}')
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ executables = [cx_Freeze.Executable("the_ball_app.py")]
 cx_Freeze.setup(
     name="the Ball",
     options={"build_exe": {
-        "packages" : ["pygame"], 
+        "packages" : ["pygame", "numpy"], 
         "include_files":["img/"]
         } },
     executables = executables
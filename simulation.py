@@ -0,0 +1,388 @@
+import random
+import math
+import hashlib
+import json
+from enum import Enum
+import numpy as np
+from ball import Ball, Charactor, SPECIAL_CHARACTORS
+from panel import Panel
+from ball_store import BallStore, CHARACTOR_BY_CODE
+from spatial_hash import SpatialHash
+from scheduler import Scheduler
+
+class LocationToPlayGround(Enum):
+    INSIDE          = 1
+    CROSSING        = 2
+    OUTSIDE         = 3
+    LEFT_OUTSIDE    = 4
+    RIGHT_OUTSIDE   = 5
+    TOP_OUTSIDE      = 6
+    BOTTOM_OUTSIDE    = 7
+
+
+SPAWN_SIDES = (LocationToPlayGround.LEFT_OUTSIDE, LocationToPlayGround.RIGHT_OUTSIDE, LocationToPlayGround.TOP_OUTSIDE, LocationToPlayGround.BOTTOM_OUTSIDE)
+# seeds are stored as unsigned 64-bit integers, any int is folded into that range
+SEED_MASK = (1 << 64) - 1
+
+class Simulation:
+    def __init__(self, playGroundPanel=None, seed=None):
+        # a fixed seed makes every reset replay the same game, None draws a new seed per game
+        self._seed                              = seed
+
+        # clock
+        self._tickRate                          = 24 # ticks per second
+        self._referenceTickRate                 = 24 # velocities are in pixels per reference tick
+
+        # playground
+        if playGroundPanel is None:
+            playGroundPanel = Panel(0, 0, 1024, 720)
+        self._playGroundPanel                   = playGroundPanel
+
+        # heroBall
+        self._initialHeroRadius                 = 16
+        self._initialHeroVelocity               = 8
+        self._heroBallVelocityRange             = (2, 24)
+        self._heroBallRadiusRange               = (5, 32)
+
+        # other balls
+        self._genBallInterval                   = 1000 # ms
+        self._genBallStdDev                     = 0.1 # in normal dist
+        self._initialVelocityMagnitudeRange     = (4, 8)
+        self._initialThetaRange                 = (-15/90*math.pi, 15/90*math.pi)
+        self._initialRadiusRange                = (5, 10)
+
+        self._genBallCharactorProb              = {
+            Charactor.ENEMY                 : 0.67,
+            Charactor.SPECIAL_SPEED_UP      : 0.06,
+            Charactor.SPECIAL_SPEED_DOWN    : 0.06,
+            Charactor.SPECIAL_SMALLER       : 0.06,
+            Charactor.SPECIAL_BIGGER        : 0.06,
+            Charactor.SPECIAL_GODLIKE       : 0.03,
+            Charactor.SPECIAL_FROZEN        : 0.03,
+            Charactor.SPECIAL_RANDOM        : 0.03,
+        }
+        self._toAddQueue                        = list()
+        self._toAddBatchSize                    = 20
+        self._statusGodlikePeriod               = 4000 # ms
+        self._statusFrozenPeriod                = 2000 # ms
+
+        # collision
+        self._broadPhase                        = 'scan' # 'scan' or 'grid'
+        self._ballCollideMode                   = False # other balls bounce off each other
+        self._gridCellSize                      = 24
+        self._continuousCollision               = True # swept hero-vs-ball test, nothing tunnels through at large steps
+
+        # level up
+        self._levelUpTimeInterval               = 15000 # ms
+        self._levelUpGenBallIntervalRatio       = 0.8
+        self._levelUpVelocityRatio              = 1.08
+        self._levelUpRadiusRatio                = 1.08
+
+        # score
+        self._collideScoreCoef                  = {
+            Charactor.ENEMY                 : 4,
+            Charactor.SPECIAL_BIGGER        : 4,
+            Charactor.SPECIAL_SMALLER       : 2,
+            Charactor.SPECIAL_SPEED_DOWN    : 4,
+            Charactor.SPECIAL_SPEED_UP      : 2,
+            Charactor.SPECIAL_GODLIKE       : 8,
+            Charactor.SPECIAL_FROZEN        : 32,
+        }
+
+        self.reset()
+
+    _RUNTIME_ATTRIBUTES = ('_seed', '_playGroundPanel', '_toAddQueue', '_stepScale', '_grid')
+
+    def config(self):
+        # the tunable parameters as plain JSON values, charactor keys by name
+        def plain(value):
+            if isinstance(value, Charactor):
+                return value.name
+            if isinstance(value, dict):
+                return {plain(k) : plain(v) for k, v in value.items()}
+            if isinstance(value, (tuple, list)):
+                return [plain(v) for v in value]
+            return value
+        config = {name : plain(value) for name, value in vars(self).items() if name.startswith('_') and name not in self._RUNTIME_ATTRIBUTES}
+        panel = self._playGroundPanel
+        config['_playGround'] = [float(panel.left), float(panel.top), float(panel.width), float(panel.height)]
+        return config
+
+    def config_hash(self):
+        text = json.dumps(self.config(), sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+    def apply_config(self, overrides):
+        # inverse of config() for a subset of parameters, takes effect on the next reset
+        for name, value in overrides.items():
+            current = getattr(self, name)
+            if isinstance(current, dict):
+                value = {**current, **{Charactor[k] if isinstance(k, str) else k : v for k, v in value.items()}}
+            elif isinstance(current, tuple):
+                value = tuple(value)
+            setattr(self, name, value)
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.getrandbits(32)
+        seed &= SEED_MASK
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._stepScale = self._referenceTickRate / self._tickRate
+        self.tick = 0
+        self.running = True
+        self.gameLevel = 1
+        # level dependent, grown by levelUp from the level 1 config
+        self.genBallInterval = self._genBallInterval
+        self.velocityMagnitudeRange = self._initialVelocityMagnitudeRange
+        self.radiusRange = self._initialRadiusRange
+        self._toAddQueue = list()
+        self.heroBall = Ball(
+                self._playGroundPanel.get_coord_by_percent(0.5, 0.5),
+                self._initialHeroRadius,
+                self._initialHeroVelocity,
+                Charactor.HERO)
+        self.heroPrevPosition = list(self.heroBall.position)
+        self.otherBalls = BallStore()
+        self._grid = SpatialHash(self._playGroundPanel, self._gridCellSize)
+        self.score = 0.0
+        self.collideCount = {charactor : 0 for charactor in Charactor if charactor != Charactor.HERO}
+        # spawns, status expiry and level-ups
+        self.scheduler = Scheduler(self)
+        self.statusExpiry = None
+        self.scheduler.schedule(self.tick + self.ms_to_ticks(self.gen_ball_interval()), 'on_gen_ball')
+        self.schedule_level_up()
+
+    def ms_to_ticks(self, ms):
+        return max(1, round(ms * self._tickRate / 1000))
+
+    def tick_interval(self):
+        # simulated milliseconds per tick
+        return 1000 / self._tickRate
+
+    def get_ticks(self):
+        # simulated milliseconds since reset, the counterpart of pygame.time.get_ticks()
+        return self.tick * 1000 // self._tickRate
+
+    def ms_to_tick(self, ms):
+        # first tick whose get_ticks() reaches ms
+        return math.ceil(ms * self._tickRate / 1000)
+
+    def gen_ball_interval(self):
+        return int(self.genBallInterval * max(0.0, self.rng.gauss(1.0, self._genBallStdDev)))
+
+    def set_hero_move(self, moveUpDown, moveLeftRight):
+        self.heroBall.moveUpDown = moveUpDown
+        self.heroBall.moveLeftRight = moveLeftRight
+
+    def step(self):
+        self.tick += 1
+        self.on_timers()
+        self.on_loop()
+
+    def run(self, maxTicks=None):
+        while self.running and (maxTicks is None or self.tick < maxTicks):
+            self.step()
+        return self.tick
+
+    def on_timers(self):
+        self.scheduler.run(self.tick)
+
+    def on_gen_ball(self):
+        spawn = self.next_spawn()
+        self.generate_ball(spawn[0], spawn)
+        self.scheduler.schedule(self.tick + self.ms_to_ticks(self.gen_ball_interval()), 'on_gen_ball')
+
+    def on_status_expire(self):
+        self.heroBall.status = None
+        self.heroBall.statusBeginTick = None
+        self.statusExpiry = None
+
+    def schedule_level_up(self):
+        # level-ups are checked after the tick they are due in, so they fire first thing in the next one
+        dueTick = self.ms_to_tick((self.gameLevel + 1) * self._levelUpTimeInterval)
+        self.scheduler.schedule(max(dueTick, self.tick) + 1, 'on_level_up', priority=-1)
+
+    def on_level_up(self):
+        # levelUp may also be called directly, the next timer then follows the current level
+        if self.get_ticks() // self._levelUpTimeInterval > self.gameLevel:
+            self.levelUp()
+        self.schedule_level_up()
+
+    def on_loop(self):
+        # update the heroBall
+        if self.heroBall.event is not None:
+            self.heroBall.event = None
+
+        self.heroPrevPosition[0] = self.heroBall.position[0]
+        self.heroPrevPosition[1] = self.heroBall.position[1]
+        if self.heroBall.status != Charactor.SPECIAL_FROZEN:
+            if self.heroBall.moveLeftRight == 0 and self.heroBall.moveUpDown == 0:
+                velocity = 0
+            elif self.heroBall.moveLeftRight != 0 and self.heroBall.moveUpDown != 0:
+                velocity = self.heroBall.velocity / math.sqrt(2.0)
+            else:
+                velocity = self.heroBall.velocity
+            velocity *= self._stepScale
+            if velocity > 0.0:
+                self.heroBall.position[0] += self.heroBall.moveLeftRight * velocity
+                self.heroBall.position[1] += self.heroBall.moveUpDown * velocity
+                self.heroBall.position[0] = max(self._playGroundPanel.left + self.heroBall.radius, min(self._playGroundPanel.right - self.heroBall.radius, self.heroBall.position[0]))
+                self.heroBall.position[1] = max(self._playGroundPanel.top + self.heroBall.radius, min(self._playGroundPanel.bottom - self.heroBall.radius, self.heroBall.position[1]))
+
+        # update/delete other balls
+        self.otherBalls.move(self._stepScale)
+        if self._broadPhase == 'grid' or self._ballCollideMode:
+            self._grid.sync(self.otherBalls)
+        if self._ballCollideMode:
+            self.collide_balls()
+        toRemove = self.otherBalls.outside_mask(self._playGroundPanel)
+        candidates = None
+        if self._broadPhase == 'grid':
+            reach = self.heroBall.radius + self.otherBalls.max_radius()
+            if self._continuousCollision:
+                # anything the hero met on the way is still within both moves of it
+                reach += math.dist(self.heroPrevPosition, self.heroBall.position) + self.otherBalls.max_move()
+            candidates = self._grid.query(*self.heroBall.position, reach)
+        if self._continuousCollision:
+            toRemoveCollide = self.otherBalls.sweep_mask(self.heroPrevPosition, self.heroBall.position, self.heroBall.radius, candidates)
+        else:
+            toRemoveCollide = self.otherBalls.collide_mask(self.heroBall.position, self.heroBall.radius, candidates)
+        # a ball that hit the hero on its way out counts as a collision only
+        toRemove &= ~toRemoveCollide
+        # collision
+        collided = list()
+        collidedSlots = self.otherBalls.spawn_order(np.flatnonzero(toRemoveCollide))
+        for code in self.otherBalls.charactors[collidedSlots].tolist():
+            collided.append(self.collid_handler(CHARACTOR_BY_CODE[code]))
+        # remove balls
+        removed = self.otherBalls.remove(toRemove)
+        if removed > 0:
+            self.scoreUp([None] * removed, collide=False)
+
+        if len(collided) > 0:
+            self.otherBalls.remove(toRemoveCollide)
+            self.scoreUp(collided, collide=True)
+
+    def hero_interpolated_position(self, alpha):
+        if alpha >= 1.0:
+            return self.heroBall.position
+        return [p0 + (p1 - p0) * alpha for p0, p1 in zip(self.heroPrevPosition, self.heroBall.position)]
+
+    def collide_balls(self):
+        first, second = self._grid.candidate_pairs(2.0 * self.otherBalls.max_radius())
+        if len(first) > 0:
+            self.otherBalls.bounce(first, second)
+
+    def next_spawn(self):
+        if len(self._toAddQueue) == 0:
+            self._toAddQueue = self.draw_spawns(self.rng, self._toAddBatchSize)
+        return self._toAddQueue.pop()
+
+    def generate_ball(self, charactor, spawn=None):
+        if spawn is None:
+            spawn = self.next_spawn()
+        position, radius, velocity = self.place_ball(spawn, self.velocityMagnitudeRange, self.radiusRange)
+        return self.otherBalls.add(position, radius, velocity, charactor)
+
+    def draw_spawns(self, rng, k):
+        # charactor, side, direction and unit fractions of the next k spawns in one vectorized draw,
+        # the fractions are scaled by the ranges of the level the ball actually spawns in
+        batch = np.random.default_rng(rng.getrandbits(64))
+        charactors = list(self._genBallCharactorProb.keys())
+        weights = np.array(list(self._genBallCharactorProb.values()), dtype=np.float64)
+        picks = batch.choice(len(charactors), size=k, p=weights / weights.sum())
+        sides = batch.integers(0, len(SPAWN_SIDES), size=k)
+        theta = batch.uniform(self._initialThetaRange[0], self._initialThetaRange[1], size=k)
+        # velocity magnitude, position along the side, radius
+        fractions = batch.random((3, k))
+        return list(zip([charactors[i] for i in picks.tolist()], sides.tolist(), np.cos(theta).tolist(), np.sin(theta).tolist(),
+                        fractions[0].tolist(), fractions[1].tolist(), fractions[2].tolist()))
+
+    def place_ball(self, spawn, velocityMagnitudeRange, radiusRange):
+        _, side, cosTheta, sinTheta, velocityFraction, positionPercent, radiusFraction = spawn
+        side = SPAWN_SIDES[side]
+        velocityMagnitude = velocityMagnitudeRange[0] + (velocityMagnitudeRange[1] - velocityMagnitudeRange[0]) * velocityFraction
+        vx, vy = velocityMagnitude * cosTheta, velocityMagnitude * sinTheta
+        radius = radiusRange[0] + (radiusRange[1] - radiusRange[0]) * radiusFraction
+        panel = self._playGroundPanel
+        if side == LocationToPlayGround.LEFT_OUTSIDE:
+            return (panel.left - radius, panel.top + panel.height * positionPercent), radius, (vx, vy)
+        elif side == LocationToPlayGround.RIGHT_OUTSIDE:
+            return (panel.right + radius, panel.top + panel.height * positionPercent), radius, (-vx, vy)
+        elif side == LocationToPlayGround.TOP_OUTSIDE:
+            return (panel.left + panel.width * positionPercent, panel.top - radius), radius, (vy, vx)
+        else:
+            return (panel.left + panel.width * positionPercent, panel.bottom + radius), radius, (vy, -vx)
+
+    def get_ball_relative_location(self, ball):
+        leftMost = ball.position[0] - ball.radius
+        rightMost = ball.position[0] + ball.radius
+        upMost = ball.position[1] - ball.radius
+        downMost = ball.position[1] + ball.radius
+        panel = self._playGroundPanel
+        if leftMost >= panel.left and rightMost <= panel.right and upMost >= panel.top and downMost <= panel.bottom:
+            return LocationToPlayGround.INSIDE, None
+        elif rightMost < panel.left or leftMost > panel.right or downMost < panel.top or upMost > panel.bottom:
+            details = set()
+            if rightMost < panel.left:
+                details.add(LocationToPlayGround.LEFT_OUTSIDE)
+            if leftMost > panel.right:
+                details.add(LocationToPlayGround.RIGHT_OUTSIDE)
+            if downMost < panel.top:
+                details.add(LocationToPlayGround.TOP_OUTSIDE)
+            if upMost > panel.bottom:
+                details.add(LocationToPlayGround.BOTTOM_OUTSIDE)
+            return LocationToPlayGround.OUTSIDE, details
+        else:
+            return LocationToPlayGround.CROSSING, None
+
+    def levelUp(self):
+        self.gameLevel += 1
+        self.genBallInterval *= self._levelUpGenBallIntervalRatio
+        self.velocityMagnitudeRange = tuple(x * self._levelUpVelocityRatio for x in self.velocityMagnitudeRange)
+        self.radiusRange = tuple(x * self._levelUpRadiusRatio for x in self.radiusRange)
+
+    def collid_handler(self, charactor):
+        self.collideCount[charactor] += 1
+        if charactor == Charactor.ENEMY:
+            if self.heroBall.status != Charactor.SPECIAL_GODLIKE:
+                self.running = False
+        else:
+            # resolve random
+            if charactor == Charactor.SPECIAL_RANDOM:
+                charactor = self.rng.choice(SPECIAL_CHARACTORS)
+            # apply
+            self.heroBall.event = charactor
+            if charactor == Charactor.SPECIAL_BIGGER:
+                if self.heroBall.radius > self._heroBallRadiusRange[0]:
+                    self.heroBall.radius += 1
+            elif charactor == Charactor.SPECIAL_SMALLER:
+                if self.heroBall.radius < self._heroBallRadiusRange[1]:
+                    self.heroBall.radius -= 1
+            elif charactor == Charactor.SPECIAL_SPEED_UP:
+                if self.heroBall.velocity < self._heroBallVelocityRange[1]:
+                    self.heroBall.velocity += 1
+            elif charactor == Charactor.SPECIAL_SPEED_DOWN:
+                if self.heroBall.velocity > self._heroBallVelocityRange[0]:
+                    self.heroBall.velocity -= 1
+            elif charactor == Charactor.SPECIAL_GODLIKE:
+                self.set_status(Charactor.SPECIAL_GODLIKE, self._statusGodlikePeriod)
+            elif charactor == Charactor.SPECIAL_FROZEN:
+                self.set_status(Charactor.SPECIAL_FROZEN, self._statusFrozenPeriod)
+        return charactor
+
+    def set_status(self, status, period):
+        # a new status replaces the current one along with its expiry
+        self.heroBall.status = status
+        self.heroBall.statusBeginTick = self.get_ticks()
+        self.scheduler.cancel(self.statusExpiry)
+        self.statusExpiry = self.scheduler.schedule(self.ms_to_tick(self.heroBall.statusBeginTick + period), 'on_status_expire')
+
+    def scoreUp(self, charactors, collide):
+        basePoint = math.sqrt(self.gameLevel)
+        if not collide:
+            self.score += basePoint * len(charactors)
+        else:
+            for charactor in charactors:
+                self.score += basePoint * self._collideScoreCoef[charactor]
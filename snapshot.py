@@ -0,0 +1,299 @@
+# save states of a Simulation as flat bytes, and a bounded ring of keyframes and key masks for rewinding
+#   python3 snapshot.py --ticks 2400 --balls 1000      measure push time and bytes per tick
+# a state holds everything step() reads: hero, live balls, spawn queue, level, score, rng and pending timers,
+# the config is not included and must match the simulation the state is restored into
+
+import argparse
+import collections
+import struct
+import time
+import zlib
+import numpy as np
+from ball import Charactor
+from ball_store import BallStore, CHARACTOR_BY_CODE
+from replay import mask_to_move
+from scheduler import Scheduler
+from simulation import Simulation
+from spatial_hash import SpatialHash
+
+# tick, running, level, score, seed, genBallInterval, velocityMagnitudeRange, radiusRange,
+# hero position, prevPosition, radius, velocity, moveUpDown, moveLeftRight, status, statusBeginTick, event,
+# store capacity, size, count, nextSerial, gauss_next present, gauss_next,
+# spawn queue length, timer count, index of the status expiry timer
+_HEADER = struct.Struct('<q?qdQd2d2d2d2dddbbbqbIIIq?dIIi')
+_SPAWN = struct.Struct('<bbddddd')
+_TIMER = struct.Struct('<qbB')
+_RNG_WORDS = 625
+_BALL_FIELDS = (('positions', '<f8'), ('velocities', '<f8'), ('radii', '<f8'), ('serials', '<i8'), ('charactors', 'i1'))
+_COUNTED = [charactor for charactor in Charactor if charactor != Charactor.HERO]
+
+
+def _code(charactor):
+    return 0 if charactor is None else charactor.value
+
+
+def _charactor(code):
+    return None if code == 0 else CHARACTOR_BY_CODE[code]
+
+
+def encode_state(sim):
+    hero = sim.heroBall
+    store = sim.otherBalls
+    rngVersion, rngWords, gaussNext = sim.rng.getstate()
+    pending = [handle for _, _, _, handle in sorted(sim.scheduler._heap) if not handle.cancelled]
+    expiryIndex = pending.index(sim.statusExpiry) if sim.statusExpiry in pending else -1
+    out = bytearray(_HEADER.pack(
+        sim.tick, sim.running, sim.gameLevel, sim.score, sim.seed, sim.genBallInterval,
+        *sim.velocityMagnitudeRange, *sim.radiusRange,
+        *hero.position, *sim.heroPrevPosition, hero.radius, hero.velocity, hero.moveUpDown, hero.moveLeftRight,
+        _code(hero.status), -1 if hero.statusBeginTick is None else hero.statusBeginTick, _code(hero.event),
+        store.capacity, store.size, store.count, store.nextSerial, gaussNext is not None, gaussNext or 0.0,
+        len(sim._toAddQueue), len(pending), expiryIndex))
+    out += np.array([sim.collideCount[charactor] for charactor in _COUNTED], dtype='<i8').tobytes()
+    out += np.array(rngWords, dtype='<u4').tobytes()
+    # which slots below size are alive, then the fields of the live balls only; the free list is the dead
+    # slots below size and prevPositions are overwritten by the next move, both are rebuilt on decode
+    out += np.packbits(store.alive[:store.size]).tobytes()
+    live = store.alive_slots()
+    for array, dtype in _BALL_FIELDS:
+        out += np.ascontiguousarray(getattr(store, array)[live], dtype=dtype).tobytes()
+    for charactor, *spawn in sim._toAddQueue:
+        out += _SPAWN.pack(charactor.value, *spawn)
+    for handle in pending:
+        if handle.args:
+            raise ValueError(f'timer {handle.name} has arguments, only named callbacks can be saved')
+        name = handle.name.encode()
+        out += _TIMER.pack(handle.tick, handle.priority, len(name)) + name
+    return bytes(out)
+
+
+def decode_state(sim, state):
+    # restores state into sim in place, sim must have been reset once
+    (tick, running, gameLevel, score, seed, genBallInterval, v0, v1, r0, r1,
+     x, y, prevX, prevY, radius, velocity, moveUpDown, moveLeftRight, status, statusBeginTick, event,
+     capacity, size, count, nextSerial, hasGauss, gaussNext,
+     queueLength, timerCount, expiryIndex) = _HEADER.unpack_from(state)
+    offset = _HEADER.size
+    sim.tick = tick
+    sim.running = running
+    sim.gameLevel = gameLevel
+    sim.score = score
+    sim.seed = seed
+    sim.genBallInterval = genBallInterval
+    sim.velocityMagnitudeRange = (v0, v1)
+    sim.radiusRange = (r0, r1)
+
+    hero = sim.heroBall
+    hero.position = [x, y]
+    sim.heroPrevPosition = [prevX, prevY]
+    # keep the number types of the config, the hud prints them
+    hero.radius = type(sim._initialHeroRadius)(radius)
+    hero.velocity = type(sim._initialHeroVelocity)(velocity)
+    hero.moveUpDown = moveUpDown
+    hero.moveLeftRight = moveLeftRight
+    hero.status = _charactor(status)
+    hero.statusBeginTick = None if statusBeginTick < 0 else statusBeginTick
+    hero.event = _charactor(event)
+
+    counts = np.frombuffer(state, dtype='<i8', count=len(_COUNTED), offset=offset)
+    offset += counts.nbytes
+    sim.collideCount = {charactor : int(n) for charactor, n in zip(_COUNTED, counts.tolist())}
+    rngWords = np.frombuffer(state, dtype='<u4', count=_RNG_WORDS, offset=offset)
+    offset += rngWords.nbytes
+    sim.rng.setstate((3, tuple(rngWords.tolist()), gaussNext if hasGauss else None))
+
+    store = sim.otherBalls
+    if store.capacity != capacity:
+        store = sim.otherBalls = BallStore(capacity)
+    packed = np.frombuffer(state, dtype=np.uint8, count=(size + 7) // 8, offset=offset)
+    offset += packed.nbytes
+    store.alive[:size] = np.unpackbits(packed, count=size).astype(bool)
+    store.alive[size:] = False
+    live = np.flatnonzero(store.alive[:size])
+    for name, dtype in _BALL_FIELDS:
+        target = getattr(store, name)
+        array = np.frombuffer(state, dtype=dtype, count=count * int(np.prod(target.shape[1:])), offset=offset)
+        target[live] = array.reshape((count,) + target.shape[1:])
+        offset += array.nbytes
+    # only drawing reads prevPositions before the next move, one tick back along the velocity is close enough
+    store.prevPositions[live] = store.positions[live] - store.velocities[live] * sim._stepScale
+    store.size = size
+    store.count = count
+    store.nextSerial = nextSerial
+    # ascending, so already a heap
+    store._free = np.flatnonzero(~store.alive[:size]).tolist()
+    # slot contents changed under the spatial hash, it rebuilds on its next sync
+    store.generation += 1
+    sim._grid = SpatialHash(sim._playGroundPanel, sim._gridCellSize)
+
+    queue = list()
+    for _ in range(queueLength):
+        code, *spawn = _SPAWN.unpack_from(state, offset)
+        queue.append((CHARACTOR_BY_CODE[code], *spawn))
+        offset += _SPAWN.size
+    sim._toAddQueue = queue
+
+    # rescheduled in firing order, so ties keep their order against timers scheduled later
+    sim.scheduler = Scheduler(sim)
+    sim.statusExpiry = None
+    for i in range(timerCount):
+        timerTick, priority, nameLength = _TIMER.unpack_from(state, offset)
+        offset += _TIMER.size
+        name = state[offset:offset + nameLength].decode()
+        offset += nameLength
+        handle = sim.scheduler.schedule(timerTick, name, priority=priority)
+        if i == expiryIndex:
+            sim.statusExpiry = handle
+    return sim
+
+
+def fork(sim, state=None):
+    # a separate headless simulation with the config of sim, at its current state or at a saved one
+    child = Simulation(sim._playGroundPanel, sim._seed)
+    child.apply_config({name : value for name, value in sim.config().items() if name != '_playGround'})
+    child.reset(sim.seed)
+    return decode_state(child, encode_state(sim) if state is None else state)
+
+
+class SnapshotRing:
+    # the last `capacity` ticks of a game as a keyframe every keyframeInterval ticks plus the key mask
+    # each tick was stepped with; the simulation is deterministic, so any tick in between is rebuilt by
+    # stepping forward from the keyframe before it, and a tick costs one byte unless it is a keyframe.
+    # level: zlib level of the keyframes, None keeps them raw; ball fields hardly compress and a level 1
+    # pass over thousands of balls takes longer than a frame
+    def __init__(self, capacity, keyframeInterval=24, level=None):
+        self.capacity = capacity
+        self.keyframeInterval = keyframeInterval
+        self.level = level
+        self.entries = collections.deque() # (tick, keyframe or None, key mask stepped into the tick)
+        self.nbytes = 0
+        self._sinceKeyframe = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def first_tick(self):
+        return self.entries[0][0] if self.entries else None
+
+    def last_tick(self):
+        return self.entries[-1][0] if self.entries else None
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self._sinceKeyframe = 0
+
+    def push(self, sim, mask=0):
+        # after each step, with the key mask the step was taken with
+        if self.entries and sim.tick != self.last_tick() + 1:
+            # not the tick after the newest one, start over
+            self.clear()
+        keyframe = None
+        if not self.entries or self._sinceKeyframe >= self.keyframeInterval:
+            keyframe = encode_state(sim)
+            if self.level is not None:
+                keyframe = zlib.compress(keyframe, self.level)
+            self._sinceKeyframe = 0
+        self.entries.append((sim.tick, keyframe, mask))
+        self.nbytes += 1 if keyframe is None else len(keyframe)
+        self._sinceKeyframe += 1
+        # drop whole keyframe groups, the masks are useless without the keyframe before them
+        while len(self.entries) > self.capacity:
+            nextKeyframe = next((i for i, entry in enumerate(self.entries) if i > 0 and entry[1] is not None), None)
+            if nextKeyframe is None or len(self.entries) - nextKeyframe < self.capacity:
+                break
+            for _ in range(nextKeyframe):
+                _, keyframe, _ = self.entries.popleft()
+                self.nbytes -= 1 if keyframe is None else len(keyframe)
+
+    def restore(self, sim, tick):
+        # puts sim in its state at tick: the keyframe before it, stepped forward through the recorded masks
+        first = self.first_tick()
+        if first is None or not first <= tick <= self.last_tick():
+            raise KeyError(f'tick {tick} is not in the ring')
+        index = tick - first
+        start = index
+        while self.entries[start][1] is None:
+            start -= 1
+        keyframe = self.entries[start][1]
+        decode_state(sim, keyframe if self.level is None else zlib.decompress(keyframe))
+        for i in range(start + 1, index + 1):
+            sim.set_hero_move(*mask_to_move(self.entries[i][2]))
+            sim.step()
+        return sim
+
+    def state(self, tick, sim):
+        # the raw state at tick, rebuilt on a fork of sim so sim itself is left alone
+        return encode_state(self.restore(fork(sim), tick))
+
+    def truncate(self, tick):
+        # forget every tick after tick
+        while self.entries and self.last_tick() > tick:
+            _, keyframe, _ = self.entries.pop()
+            self.nbytes -= 1 if keyframe is None else len(keyframe)
+        self._sinceKeyframe = 0
+        for entry in reversed(self.entries):
+            self._sinceKeyframe += 1
+            if entry[1] is not None:
+                break
+
+    def rewind(self, sim, ticks=1):
+        # restores sim to ticks before its current tick, or the oldest one kept; returns the tick restored
+        if not self.entries:
+            return None
+        tick = max(self.first_tick(), min(sim.tick, self.last_tick()) - ticks)
+        self.truncate(tick)
+        self.restore(sim, tick)
+        return tick
+
+    def bytes_per_tick(self):
+        return self.nbytes / max(1, len(self.entries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure the rewind ring on a headless game')
+    parser.add_argument('--ticks', type=int, default=240, help='ticks to run, the ring keeps all of them')
+    parser.add_argument('--balls', type=int, default=0, help='extra balls spawned before the first tick')
+    parser.add_argument('--level', type=int, default=1, help='start at this level')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keyframe-interval', type=int, default=24)
+    parser.add_argument('--zlib-level', type=int, default=None, help='compress keyframes at this level')
+    args = parser.parse_args()
+
+    sim = Simulation(seed=args.seed)
+    for _ in range(args.level - 1):
+        sim.levelUp()
+    # slow godlike balls: they stay for the whole run and keep the hero alive however many of them it runs into
+    velocityRange = sim.velocityMagnitudeRange
+    sim.velocityMagnitudeRange = (velocityRange[0] / 10.0, velocityRange[1] / 10.0)
+    for _ in range(args.balls):
+        sim.generate_ball(Charactor.SPECIAL_GODLIKE)
+    sim.velocityMagnitudeRange = velocityRange
+    ring = SnapshotRing(args.ticks + 1, args.keyframe_interval, args.zlib_level)
+    ring.push(sim)
+    stepSeconds = pushSeconds = worstPushSeconds = 0.0
+    balls = 0
+    while sim.running and sim.tick < args.ticks:
+        begin = time.perf_counter()
+        sim.step()
+        stepSeconds += time.perf_counter() - begin
+        begin = time.perf_counter()
+        ring.push(sim)
+        pushSeconds += time.perf_counter() - begin
+        worstPushSeconds = max(worstPushSeconds, time.perf_counter() - begin)
+        balls += len(sim.otherBalls)
+    ticks = max(1, sim.tick)
+    keyframes = [len(keyframe) for _, keyframe, _ in ring.entries if keyframe is not None]
+    begin = time.perf_counter()
+    state = ring.state(ring.last_tick(), sim)
+    restoreSeconds = time.perf_counter() - begin
+    if state != encode_state(sim):
+        raise SystemExit(f'tick {ring.last_tick()} rebuilt from the ring differs from the game')
+    print(f'{sim.tick} ticks, {balls / ticks:.0f} balls on average, raw state {len(state)} bytes')
+    print(f'keyframe {np.mean(keyframes):.0f} bytes every {args.keyframe_interval} ticks, {ring.bytes_per_tick():.0f} bytes per tick')
+    print(f'step {stepSeconds / ticks * 1e3:.2f} ms, push {pushSeconds / ticks * 1e3:.2f} ms per tick '
+          f'({worstPushSeconds * 1e3:.2f} ms at most), restore of the last tick {restoreSeconds * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import math
+import numpy as np
+
+class SpatialHash:
+    # uniform grid over panel coordinates, each id lives in the cell holding its center
+    def __init__(self, panel, cellSize):
+        self.panel = panel
+        self.cellSize = cellSize
+        self.cells = dict()
+        self.keys = dict()
+        # per-slot cell coordinates when synced against a BallStore
+        self._slotCellX = np.zeros(0, dtype=np.int64)
+        self._slotCellY = np.zeros(0, dtype=np.int64)
+        self._slotIn = np.zeros(0, dtype=bool)
+        self._storeGeneration = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key_of(self, x, y):
+        return (int((x - self.panel.left) // self.cellSize), int((y - self.panel.top) // self.cellSize))
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+        self._slotIn[:] = False
+
+    def insert(self, id, x, y):
+        self._insert_key(id, self.key_of(x, y))
+
+    def remove(self, id):
+        key = self.keys.pop(id)
+        cell = self.cells[key]
+        cell.discard(id)
+        if len(cell) == 0:
+            del self.cells[key]
+
+    def move(self, id, x, y):
+        key = self.key_of(x, y)
+        if self.keys.get(id) != key:
+            if id in self.keys:
+                self.remove(id)
+            self._insert_key(id, key)
+
+    def _insert_key(self, id, key):
+        self.keys[id] = key
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = {id}
+        else:
+            cell.add(id)
+
+    def query(self, x, y, reach):
+        # ids whose center may lie within reach of (x, y)
+        x0, y0 = self.key_of(x - reach, y - reach)
+        x1, y1 = self.key_of(x + reach, y + reach)
+        found = list()
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            for (cx, cy), cell in self.cells.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    found.extend(cell)
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cell = self.cells.get((cx, cy))
+                    if cell is not None:
+                        found.extend(cell)
+        return found
+
+    def candidate_pairs(self, reach):
+        # pairs (i, j) whose centers may lie within reach of each other, each pair once
+        span = max(1, math.ceil(reach / self.cellSize))
+        offsets = [(dx, dy) for dx in range(-span, span + 1) for dy in range(0, span + 1) if dy > 0 or dx > 0]
+        first = list()
+        second = list()
+        for (cx, cy), cell in self.cells.items():
+            ids = sorted(cell)
+            for k, i in enumerate(ids):
+                for j in ids[k + 1:]:
+                    first.append(i)
+                    second.append(j)
+            for dx, dy in offsets:
+                other = self.cells.get((cx + dx, cy + dy))
+                if other is not None:
+                    for i in ids:
+                        for j in other:
+                            first.append(i)
+                            second.append(j)
+        return np.array(first, dtype=np.int64), np.array(second, dtype=np.int64)
+
+    def sync(self, store):
+        # incremental update against a BallStore, only balls that changed cell touch the dicts
+        if self._storeGeneration != store.generation:
+            self.cells.clear()
+            self.keys.clear()
+            self._slotIn = np.zeros(0, dtype=bool)
+            self._storeGeneration = store.generation
+        if len(self._slotIn) < store.capacity:
+            grow = store.capacity - len(self._slotIn)
+            self._slotCellX = np.concatenate((self._slotCellX, np.zeros(grow, dtype=np.int64)))
+            self._slotCellY = np.concatenate((self._slotCellY, np.zeros(grow, dtype=np.int64)))
+            self._slotIn = np.concatenate((self._slotIn, np.zeros(grow, dtype=bool)))
+        n = store.size
+        cellX = np.floor_divide(store.positions[:n, 0] - self.panel.left, self.cellSize).astype(np.int64)
+        cellY = np.floor_divide(store.positions[:n, 1] - self.panel.top, self.cellSize).astype(np.int64)
+        alive = store.alive[:n]
+        wasIn = self._slotIn[:n]
+        gone = wasIn & ~alive
+        for slot in np.flatnonzero(gone).tolist():
+            self.remove(slot)
+        changed = alive & (~wasIn | (cellX != self._slotCellX[:n]) | (cellY != self._slotCellY[:n]))
+        for slot, cx, cy in zip(np.flatnonzero(changed).tolist(), cellX[changed].tolist(), cellY[changed].tolist()):
+            if slot in self.keys:
+                self.remove(slot)
+            self._insert_key(slot, (cx, cy))
+        # slots beyond size were dropped by the store
+        for slot in np.flatnonzero(self._slotIn[n:]).tolist():
+            self.remove(n + slot)
+        self._slotIn[n:] = False
+        self._slotCellX[:n] = cellX
+        self._slotCellY[:n] = cellY
+        self._slotIn[:n] = alive
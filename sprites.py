@@ -0,0 +1,50 @@
+from collections import OrderedDict
+import pygame
+import pygame.gfxdraw
+
+class SpriteCache:
+    # pre-rasterized circles keyed by (color, integer radius, antialias), bounded LRU
+    def __init__(self, maxSprites=512, antialias=False):
+        self.maxSprites = maxSprites
+        self.antialias = antialias
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def get(self, color, radius):
+        key = (color, radius, self.antialias)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self.rasterize(color, radius, self.antialias)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.maxSprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    @staticmethod
+    def rasterize(color, radius, antialias=False):
+        # the circle center sits at (radius, radius), blit at (x - radius, y - radius)
+        size = 2 * radius + 1
+        if antialias:
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            if radius > 0:
+                pygame.gfxdraw.filled_circle(sprite, radius, radius, radius, color)
+                pygame.gfxdraw.aacircle(sprite, radius, radius, radius, color)
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            return sprite
+        colorKey = (255, 0, 255) if tuple(color) != (255, 0, 255) else (0, 255, 0)
+        sprite = pygame.Surface((size, size))
+        sprite.fill(colorKey)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        sprite.set_colorkey(colorKey, pygame.RLEACCEL)
+        return sprite
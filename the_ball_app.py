@@ -4,38 +4,52 @@ import random
 import pygame
 from pygame.locals import *
 import colors
-import math
 import os
 import sys
 from pathlib import Path
-from enum import Enum
-from ball import Ball, Charactor, SPECIAL_CHARACTORS
+from ball import Charactor, SPECIAL_CHARACTORS
 from panel import Panel
-from pygame.time import set_timer
-
-class LocationToPlayGround(Enum):
-    INSIDE          = 1
-    CROSSING        = 2
-    OUTSIDE         = 3
-    LEFT_OUTSIDE    = 4
-    RIGHT_OUTSIDE   = 5
-    TOP_OUTSIDE      = 6
-    BOTTOM_OUTSIDE    = 7
-
+from simulation import Simulation
+from hud import TextCache, Label
+from sprites import SpriteCache
+from replay import Replay, key_mask, mask_to_move
+from profiler import FrameProfiler
+from snapshot import SnapshotRing
+from asset_cache import AssetCache, StartupTimer
+from score_store import ScoreStore, result_row, PLAYER_SOURCES
+from governor import QualityGovernor, TIERS, effective_tiers
+import time
+import numpy as np
 
 class App:
-    def __init__(self):
+    def __init__(self, seed=None, recordPath=None, replayPath=None, pipelined=False, startupReport=False, fixedQuality=False, dirtyRects=False, rewind=False):
         # basic 
         self._running                           = True
-        self._clockTickNumber                   = 24
-        self._appDir                            = Path(os.path.dirname(os.path.realpath(__file__)))
-        self._recordFileName                    = 'record.dat'
+        self._clockTickNumber                   = 60 # rendered frames per second, the simulation runs at Simulation._tickRate
+        self._maxFrameTime                      = 250 # ms, longer frames are not caught up to avoid a spiral of death
+        self._pipelined                         = pipelined # simulate on a second thread while the latest finished tick is drawn
+        # next to the executable in a frozen build, __file__ is inside its library archive then
+        self._appDir                            = Path(os.path.dirname(os.path.realpath(sys.executable if getattr(sys, 'frozen', False) else __file__)))
+        self._recordFileName                    = 'record.dat' # best result of older versions, imported once
+        self._scoreDbFileName                   = 'scores.sqlite3'
+        self._cacheDirName                      = 'cache' # pre-scaled images and resolved fonts
+        self._startupReport                     = startupReport # print the time of each startup phase
 
         # screen 
         self._screenWidth                       = 1280
         self._screenHeight                      = 720
         self._screenSize                        = (self._screenWidth, self._screenHeight)
         self._displayMode                       = pygame.HWSURFACE | pygame.DOUBLEBUF
+        self._renderMode                        = 'dirty' if dirtyRects else 'full' # 'full' or 'dirty'
+        self._dirtyAreaFallbackRatio            = 0.3 # full redraw when dirty rects cover more of the screen
+        self._antialias                         = False
+        self._maxSprites                        = 512
+        self._profilerCapacity                  = 600 # frames kept by the profiler
+        self._governQuality                     = not fixedQuality # lower the render quality when frames get too slow
+        self._qualityWindow                     = 60 # frames the governor averages over
+        self._lodRadius                         = 3 # px, smaller balls are drawn as dots at the lowest quality
+        self._rewind                            = rewind # keep the last ticks so held backspace steps back through them
+        self._rewindSeconds                     = 10 # game time kept for rewinding
 
         # playground
         self._playGroundWidthRatio              = (0.0, 0.8)
@@ -58,310 +72,524 @@ class App:
         self._statusImgHeightRatio              = 0.06
         self._statusImgSize                     = (int(self._statusImgWidthRatio * self._screenWidth), int(self._statusImgHeightRatio * self._screenHeight))
 
-        # heroBall
-        self._initialHeroRadius                 = 16
-        self._initialHeroVelocity               = 8
-        self._heroBallVelocityRange             = (2, 24)
-        self._heroBallRadiusRange               = (5, 32)
-
-        # other balls
-        self._genBallInterval                   = 1000 # ms
-        self._genBallStdDev                     = 0.1 # in normal dist
-        self._initialVelocityMagnitudeRange     = (4, 8)
-        self._initialThetaRange                 = (-15/90*math.pi, 15/90*math.pi)
-        self._initialRadiusRange                = (5, 10)
-
-        self._genBallCharactorProb              = { 
-            Charactor.ENEMY                 : 0.67,
-            Charactor.SPECIAL_SPEED_UP      : 0.06,
-            Charactor.SPECIAL_SPEED_DOWN    : 0.06,
-            Charactor.SPECIAL_SMALLER       : 0.06,
-            Charactor.SPECIAL_BIGGER        : 0.06,
-            Charactor.SPECIAL_GODLIKE       : 0.03,
-            Charactor.SPECIAL_FROZEN        : 0.03,
-            Charactor.SPECIAL_RANDOM        : 0.03,
-        }
-        self._toAddQueue                        = list()
-        self._toAddBatchSize                    = 20
-        self._statusGodlikePeriod               = 4000 # ms
-        self._statusFrozenPeriod                = 2000 # ms
-
-        # events
-        self._GEN_BALL_EVENT                    = pygame.USEREVENT + 1
-        self._SPECIAL_GODLIKE_EXPIRE            = pygame.USEREVENT + 2
-        self._SPECIAL_FROZEN_EXPIRE             = pygame.USEREVENT + 3
-
-        # level up
-        self._levelUpTimeInterval               = 15000 # ms
-        self._levelUpGenBallIntervalRatio       = 0.8
-        self._levelUpVelocityRatio              = 1.08
-        self._levelUpRadiusRatio                = 1.08
-
-        # score
-        self._collideScoreCoef                  = { 
-            Charactor.ENEMY                 : 4,
-            Charactor.SPECIAL_BIGGER        : 4,
-            Charactor.SPECIAL_SMALLER       : 2,
-            Charactor.SPECIAL_SPEED_DOWN    : 4,
-            Charactor.SPECIAL_SPEED_UP      : 2,
-            Charactor.SPECIAL_GODLIKE       : 8,
-            Charactor.SPECIAL_FROZEN        : 32,
-        }
+        # simulation
+        self.sim = Simulation(self._playGroundPanel, seed)
 
+        # replay
+        self._recordPath                        = recordPath
+        self._replayPath                        = replayPath
 
 
     def on_init(self):
-        # initialization
-        pygame.init()
+        startup = StartupTimer()
+        # initialization, only the subsystems in use
+        pygame.display.init()
         pygame.font.init()
         self.screen = pygame.display.set_mode(self._screenSize, self._displayMode)
         self.screen.fill(colors.BGCOLOR)
         self.clock = pygame.time.Clock()
-        self.gameLevel = 1
-        self.heroBall = Ball(
-                self._playGroundPanel.get_coord_by_percent(0.5, 0.5),
-                self._initialHeroRadius,
-                self._initialHeroVelocity,
-                Charactor.HERO)
-        self.otherBalls = set()
-        set_timer(self._GEN_BALL_EVENT, int(self._genBallInterval * max(0.0, random.gauss(1.0, self._genBallStdDev))))
-        self.score = 0.0
+        startup.mark('display')
+        self._keyMask = 0
+        self._replay = None
+        self._recording = None
+        if self._replayPath is not None:
+            self._replay = Replay.load(self._replayPath)
+            self.sim = self._replay.new_simulation()
+        else:
+            self.sim.reset()
+        if self._recordPath is not None:
+            self._recording = Replay.for_simulation(self.sim)
+        self.snapshots = None
+        if self._rewind:
+            self.snapshots = SnapshotRing(self._rewindSeconds * self.sim._tickRate, self.sim._tickRate)
+            self.snapshots.push(self.sim)
+        self._rewinding = False
+        startup.mark('simulation')
         # images
+        self.assets = AssetCache(self._appDir / self._cacheDirName)
         self.imgs = {
-            'statusGodlike' : pygame.transform.scale(pygame.image.load('img/SPECIAL_GODLIKE.png'), self._statusImgSize),
-            'statusFrozen' : pygame.transform.scale(pygame.image.load('img/SPECIAL_FROZEN.png'), self._statusImgSize),
+            'statusGodlike' : self.assets.scaled_image(self._appDir / 'img' / 'SPECIAL_GODLIKE.png', self._statusImgSize).convert_alpha(),
+            'statusFrozen' : self.assets.scaled_image(self._appDir / 'img' / 'SPECIAL_FROZEN.png', self._statusImgSize).convert_alpha(),
+        }
+        self.init_render_state()
+        startup.mark('images')
+        # hud
+        self.textCache = TextCache(fontResolver=self.assets.font_path)
+        scoreBoardFont = self.textCache.get_font('Calibri', 30)
+        self.scoreBoardLabels = {
+            'level' : Label(self.textCache, scoreBoardFont, 'Level : {}', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.0)),
+            'scoreTitle' : Label(self.textCache, scoreBoardFont, 'Score : ', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.24)),
+            'score' : Label(self.textCache, scoreBoardFont, '{:.1f}', self._scoreBoardPanel.get_coord_by_percent(0.1, 0.4)),
+            'radius' : Label(self.textCache, scoreBoardFont, 'Radius : {}', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.5)),
+            'velocity' : Label(self.textCache, scoreBoardFont, 'Velocity : {}', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.6)),
+            'statusTitle' : Label(self.textCache, scoreBoardFont, 'Status', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.7)),
+            'quality' : Label(self.textCache, scoreBoardFont, 'Quality : {}', self._scoreBoardPanel.get_coord_by_percent(0.02, 0.1)),
         }
+        startup.mark('fonts')
+        self._statusRects = [
+            Rect(*self._scoreBoardPanel.get_coord_by_percent(0.5, 0.69), *self._statusImgSize),
+            Rect(*self._scoreBoardPanel.get_coord_by_percent(0.1, 0.8), self._scoreBoardPanel.width * 0.8 + 1, self._scoreBoardPanel.width * 0.1 + 1),
+        ]
+        # profiler, toggled with F3 and dumped with F4
+        self.profiler = FrameProfiler(self._profilerCapacity)
+        self._profiling = False
+        self._profilerRect = Rect(*self._scoreBoardPanel.get_coord_by_percent(0.02, 0.9), self._scoreBoardPanel.width * 0.96, self._scoreBoardPanel.height * 0.09)
+        # quality governor, budget is the frame time at the target frame rate
+        self.governor = QualityGovernor(1000 / self._clockTickNumber, self._qualityWindow, tiers=effective_tiers(TIERS, self._antialias, self._renderMode == 'dirty'))
+        self.apply_quality()
+        # dirty rect rendering
+        self._fullRedraw = True
+        self._prevBallRects = list()
+        self._prevStatus = None
         # record
-        try:
-            with open(self._appDir / self._recordFileName, 'r') as recf:
-                self.levelRecord = int(next(recf))
-                self.scoreRecord = float(next(recf))
-        except FileNotFoundError:
-            self.levelRecord = 1
-            self.scoreRecord = 0.0
-            
+        self.scores = ScoreStore(self._appDir / self._scoreDbFileName)
+        self.scores.migrate_record(self._appDir / self._recordFileName)
+        self.levelRecord, self.scoreRecord = self.scores.best(sources=PLAYER_SOURCES) or (1, 0.0)
+        self.assets.save()
+        startup.mark('record')
+        if self._startupReport:
+            print(f'startup, {self.assets.hits} cache hits, {self.assets.misses} misses', file=sys.stderr)
+            print(startup.report(), file=sys.stderr)
 
         return True
  
+    def init_render_state(self):
+        # what render_playground needs, no display required
+        # the renderer reads game state from view, the simulation itself or a copy of a finished tick
+        self.view = self.sim
+        self.sprites = SpriteCache(self._maxSprites, self._antialias)
+        self._frameCount = 0
+        self._alpha = 1.0
+        self._randomColorCodes = np.array([charactor.value for charactor in SPECIAL_CHARACTORS], dtype=np.int64)
+        # full quality until a governor says otherwise
+        self._hudInterval = 1
+        self._renderScale = 1.0
+        self._lod = False
+        self._lowResSurface = None
+        self._dotColors = None
+
+    def apply_quality(self):
+        quality = self.governor.quality
+        self.sprites.antialias = self._antialias and quality.antialias
+        self._hudInterval = quality.hudInterval
+        self._renderScale = quality.renderScale
+        self._lod = quality.lod
+        self._lowResSurface = None
+        if self._renderScale < 1.0:
+            size = (int(self._playGroundPanel.width * self._renderScale), int(self._playGroundPanel.height * self._renderScale))
+            self._lowResSurface = pygame.Surface(size).convert()
+        self._fullRedraw = True
+
+    def govern(self, frameBegin):
+        # feeds the work time of the frame that began at frameBegin to the governor
+        if self._governQuality and self.governor.update((time.perf_counter() - frameBegin) * 1000.0):
+            self.apply_quality()
+
     def on_event(self, event):
         if event.type == pygame.QUIT:
             self._running = False
+        elif event.type == pygame.KEYDOWN and event.key == K_F3:
+            self.profiler.toggle()
+            self._fullRedraw = True
+        elif event.type == pygame.KEYDOWN and event.key == K_F4:
+            self.dump_profile()
         elif event.type == pygame.KEYDOWN or event.type == pygame.KEYUP:
             # resolve keyboard control
             pressedKeys = pygame.key.get_pressed()
-            self.heroBall.moveUpDown = 0
-            self.heroBall.moveLeftRight = 0
-            if pressedKeys[K_UP] or pressedKeys[K_w]:
-                self.heroBall.moveUpDown -= 1
-            if pressedKeys[K_DOWN] or pressedKeys[K_s]:
-                self.heroBall.moveUpDown += 1
-            if pressedKeys[K_LEFT] or pressedKeys[K_a]:
-                self.heroBall.moveLeftRight -= 1
-            if pressedKeys[K_RIGHT] or pressedKeys[K_d]:
-                self.heroBall.moveLeftRight += 1
-        elif event.type == self._GEN_BALL_EVENT:
-            if len(self._toAddQueue) == 0:
-                self._toAddQueue = random.choices(list(self._genBallCharactorProb.keys()), weights=list(self._genBallCharactorProb.values()), k=self._toAddBatchSize)
-            self.otherBalls.add(self.generate_ball(self._toAddQueue[-1]))
-            self._toAddQueue.pop()
-            set_timer(self._GEN_BALL_EVENT, int(self._genBallInterval * max(0.0, random.gauss(1.0, self._genBallStdDev))))
-        elif event.type == self._SPECIAL_GODLIKE_EXPIRE:
-            if self.heroBall.status == Charactor.SPECIAL_GODLIKE and (pygame.time.get_ticks() - self.heroBall.statusBeginTick) >= self._statusGodlikePeriod - 10:
-                self.heroBall.status = None
-                self.heroBall.statusBeginTick = None
-        elif event.type == self._SPECIAL_FROZEN_EXPIRE:
-            if self.heroBall.status == Charactor.SPECIAL_FROZEN and (pygame.time.get_ticks() - self.heroBall.statusBeginTick) >= self._statusFrozenPeriod - 10:
-                self.heroBall.status = None
-                self.heroBall.statusBeginTick = None
-        
+            self._keyMask = key_mask(pressedKeys[K_UP] or pressedKeys[K_w],
+                                     pressedKeys[K_DOWN] or pressedKeys[K_s],
+                                     pressedKeys[K_LEFT] or pressedKeys[K_a],
+                                     pressedKeys[K_RIGHT] or pressedKeys[K_d])
+            self._rewinding = self.snapshots is not None and bool(pressedKeys[K_BACKSPACE])
+
     def on_loop(self):
-        # update the heroBall
-        if self.heroBall.event is not None:
-            self.heroBall.event = None
-
-        if self.heroBall.status != Charactor.SPECIAL_FROZEN:
-            if self.heroBall.moveLeftRight == 0 and self.heroBall.moveUpDown == 0:
-                velocity = 0
-            elif self.heroBall.moveLeftRight != 0 and self.heroBall.moveUpDown != 0:
-                velocity = self.heroBall.velocity / math.sqrt(2.0)
-            else:
-                velocity = self.heroBall.velocity
-            if velocity > 0.0:
-                self.heroBall.position[0] += self.heroBall.moveLeftRight * velocity
-                self.heroBall.position[1] += self.heroBall.moveUpDown * velocity
-                self.heroBall.position[0] = max(self._playGroundPanel.left + self.heroBall.radius, min(self._playGroundPanel.right - self.heroBall.radius, self.heroBall.position[0]))
-                self.heroBall.position[1] = max(self._playGroundPanel.top + self.heroBall.radius, min(self._playGroundPanel.bottom - self.heroBall.radius, self.heroBall.position[1]))
-
-        # update/delete other balls
-        toRemove = set()
-        toRemoveCollide = set()
-        for ball in self.otherBalls:
-            ball.position[0] += ball.velocity[0]
-            ball.position[1] += ball.velocity[1]
-            # out of boundary
-            if (ball.position[0] + ball.radius < self._playGroundPanel.left and ball.velocity[0] < 0.0):
-                toRemove.add(ball)
-            elif (ball.position[0] - ball.radius > self._playGroundPanel.right and ball.velocity[0] > 0.0):
-                toRemove.add(ball)
-            elif (ball.position[1] + ball.radius < self._playGroundPanel.top and ball.velocity[1] < 0.0):
-                toRemove.add(ball)
-            elif (ball.position[1] - ball.radius > self._playGroundPanel.bottom and ball.velocity[1] > 0.0):
-                toRemove.add(ball)
-            # collision
-            if self.heroBall.collide(ball):
-                self.collid_handler(ball)
-                toRemoveCollide.add(ball)
-        # remove balls
-        if len(toRemove) > 0:
-            self.otherBalls -= toRemove
-            self.scoreUp(toRemove, collide=False)
-
-        if len(toRemoveCollide) > 0:
-            self.otherBalls -= toRemoveCollide
-            self.scoreUp(toRemoveCollide, collide=True)
-
-        # level up 
-        if pygame.time.get_ticks() // self._levelUpTimeInterval > self.gameLevel:
-            self.levelUp()
-        
+        if self._rewinding:
+            # one tick back per tick, the recording forgets the inputs of the ticks undone
+            if self.snapshots.rewind(self.sim) is not None and self._recording is not None:
+                del self._recording.masks[self.sim.tick:]
+            return
+        # key state for this tick, from the keyboard or a replay
+        if self._replay is not None:
+            if self.sim.tick >= len(self._replay):
+                self._running = False
+                return
+            mask = self._replay.masks[self.sim.tick]
+        else:
+            mask = self._keyMask
+        if self._recording is not None:
+            self._recording.record(mask)
+        self.sim.set_hero_move(*mask_to_move(mask))
+        self.sim.step()
+        if self.snapshots is not None:
+            self.snapshots.push(self.sim, mask)
+        if not self.sim.running:
+            self._running = False
 
     def on_render(self):
-        # background
-        self.screen.fill(colors.BGCOLOR)
+        self._frameCount += 1
+        hudDue = self._frameCount % self._hudInterval == 0
+        # a playground drawn at a lower resolution is always redrawn whole
+        if self._renderMode == 'dirty' and self._renderScale == 1.0:
+            self.interpolate()
+            ballRects = self.ball_rects()
+            changedLabels = self.update_scoreboard() if hudDue else list()
+            if not self._fullRedraw:
+                rects = self.render_dirty(ballRects, changedLabels, hudDue)
+                self._prevBallRects = ballRects
+                if rects is not None:
+                    pygame.display.update(rects)
+                    if self._profiling:
+                        self.profiler.mark('display_update')
+                    return
+            self._prevBallRects = ballRects
+        hudDue = hudDue or self._fullRedraw
+        self._fullRedraw = False
+        # background, the panels cover the whole screen but a throttled scoreboard keeps its last frame
+        if hudDue:
+            self.screen.fill(colors.BGCOLOR)
         # playground panel
         self.render_playground()
+        if self._profiling:
+            self.profiler.mark('render_playground')
         # scoreboard panel
-        self.render_scoreboard()
+        if hudDue:
+            self.render_scoreboard()
+        if self._profiling:
+            self.profiler.mark('render_scoreboard')
         # update display
-        pygame.display.update()
+        if hudDue:
+            pygame.display.update()
+        else:
+            pygame.display.update(self._playGroundPanel.to_rect())
+        if self._profiling:
+            self.profiler.mark('display_update')
+
+    def render_dirty(self, ballRects, changedLabels, hudDue=True):
+        # returns the rects to update, or None when a full redraw is cheaper
+        hudRects = [label.rect.union(label.prevRect) if label.prevRect else label.rect for label in changedLabels]
+        statusChanged = hudDue and (self.view.heroBall.status is not None or self._prevStatus is not None)
+        if statusChanged:
+            hudRects.extend(self._statusRects)
+        if self.profiler.enabled and hudDue:
+            hudRects.append(self._profilerRect)
+        rects = self._prevBallRects + ballRects + hudRects
+        area = sum(rect.width * rect.height for rect in rects)
+        if area > self._dirtyAreaFallbackRatio * self._screenWidth * self._screenHeight:
+            return None
+        # erase balls at their previous place
+        playGroundRect = self._playGroundPanel.to_rect()
+        for rect in self._prevBallRects:
+            self.screen.fill(colors.PLAYGROUND_BGCOLOR, rect)
+        # balls never leak into the scoreboard, which would otherwise paint over them
+        self.screen.set_clip(playGroundRect)
+        self.draw_balls()
+        self.screen.set_clip(None)
+        if self._profiling:
+            self.profiler.mark('render_playground')
+        # hud
+        for rect in hudRects:
+            self.screen.fill(colors.SCOREBOARD_BGCOLOR, rect)
+        for label in changedLabels:
+            label.draw(self.screen)
+        if statusChanged:
+            self.draw_status()
+        if self.profiler.enabled and hudDue:
+            self.profiler.draw(self.screen, self._profilerRect, 1000 / self._clockTickNumber)
+        if self._profiling:
+            self.profiler.mark('render_scoreboard')
+        return rects
+
+    def ball_rects(self):
+        # bounding rects of the hero and all other balls, clipped to the playground
+        playGroundRect = self._playGroundPanel.to_rect()
+        store = self.view.otherBalls
+        slots = self._renderSlots
+        positions = self._renderPositions
+        radii = store.radii[slots]
+        lefts = (positions[:, 0] - radii).astype(int) - 1
+        tops = (positions[:, 1] - radii).astype(int) - 1
+        sizes = (2 * radii).astype(int) + 3
+        hero = self.view.heroBall
+        heroPosition = self._renderHeroPosition
+        rects = [Rect(int(heroPosition[0] - hero.radius) - 1, int(heroPosition[1] - hero.radius) - 1, 2 * int(hero.radius) + 3, 2 * int(hero.radius) + 3)]
+        rects.extend(Rect(left, top, size, size) for left, top, size in zip(lefts.tolist(), tops.tolist(), sizes.tolist()))
+        rects = [rect.clip(playGroundRect) for rect in rects]
+        return [rect for rect in rects if rect.width > 0 and rect.height > 0]
 
     def on_cleanup(self):
         pygame.quit()
+        # waits for the result of this game to be written
+        self.scores.close()
  
     def on_execute(self):
         if not self.on_init():
             self._running = False
  
+        if self._pipelined:
+            self.render_loop()
+        else:
+            self.serial_loop()
+
+        if self._recording is not None:
+            self._recording.save(self._recordPath)
+        self.render_gameOver()
+        self.on_cleanup()
+
+    def serial_loop(self):
+        # fixed timestep: the simulation advances in constant steps, rendering interpolates between them
+        accumulator = 0.0
+        tickInterval = self.sim.tick_interval()
         while(self._running):
+            # the profiler is only touched on frames it was enabled at the start of
+            self._profiling = self.profiler.enabled
+            if self._profiling:
+                self.profiler.begin_frame()
+            accumulator += min(self.clock.tick(self._clockTickNumber), self._maxFrameTime)
+            frameBegin = time.perf_counter()
+            if self._profiling:
+                self.profiler.mark('idle')
+            for event in pygame.event.get():
+                self.on_event(event)
+            if self._profiling:
+                self.profiler.mark('event')
+            ticks = 0
+            while accumulator >= tickInterval and self._running:
+                self.on_loop()
+                accumulator -= tickInterval
+                ticks += 1
+            if self._profiling:
+                self.profiler.mark('loop')
+            self._alpha = accumulator / tickInterval
+            self.on_render()
+            self.govern(frameBegin)
+            if self._profiling:
+                self.profiler.end_frame(ticks, len(self.sim.otherBalls))
+
+    def render_loop(self):
+        # pipelined: the simulation thread publishes finished ticks, this thread handles events and draws
+        # the latest one, so simulating the next tick overlaps with drawing this one
+        # only needed in this mode, not imported at startup
+        import threading
+        from pipeline import FrameState, TripleBuffer
+        self._frames = TripleBuffer(lambda: FrameState(self.sim._tickRate))
+        self._frames.back().capture(self.sim, time.perf_counter())
+        self._frames.publish()
+        simThread = threading.Thread(target=self.simulation_loop, name='simulation', daemon=True)
+        simThread.start()
+        tickInterval = self.sim.tick_interval() / 1000.0
+        lastTick = self.sim.tick
+        while self._running:
+            self._profiling = self.profiler.enabled
+            if self._profiling:
+                self.profiler.begin_frame()
             self.clock.tick(self._clockTickNumber)
+            frameBegin = time.perf_counter()
+            if self._profiling:
+                self.profiler.mark('idle')
             for event in pygame.event.get():
                 self.on_event(event)
-            self.on_loop()
+            if self._profiling:
+                self.profiler.mark('event')
+            self.view = self._frames.latest()
+            self._alpha = min(1.0, max(0.0, (time.perf_counter() - self.view.stamp) / tickInterval))
+            if self._profiling:
+                self.profiler.mark('loop')
             self.on_render()
-        
-        self.render_gameOver()
-        self.on_cleanup()
-    
-    def generate_ball(self, charactor):
-        # choose side
-        initailLocationList = (LocationToPlayGround.LEFT_OUTSIDE, LocationToPlayGround.RIGHT_OUTSIDE, LocationToPlayGround.TOP_OUTSIDE, LocationToPlayGround.BOTTOM_OUTSIDE)
-        side = random.choice(initailLocationList)
-        # choose velocity
-        velocityMagnitude = random.uniform(self._initialVelocityMagnitudeRange[0], self._initialVelocityMagnitudeRange[1])
-        theta = random.uniform(self._initialThetaRange[0], self._initialThetaRange[1])
-        velocity = [velocityMagnitude * math.cos(theta), velocityMagnitude * math.sin(theta)]
-        # choose relative position
-        positionPercent = random.uniform(0.0, 1.0)
-        # choose radius
-        radius = random.uniform(self._initialRadiusRange[0], self._initialRadiusRange[1])
-        # construct ball
-        if side == LocationToPlayGround.LEFT_OUTSIDE:
-            position = [self._playGroundPanel.left - radius, self._playGroundPanel.top + self._playGroundPanel.height * positionPercent]
-            velocity = [velocity[0], velocity[1]]
-        elif side == LocationToPlayGround.RIGHT_OUTSIDE:
-            position = [self._playGroundPanel.right + radius, self._playGroundPanel.top + self._playGroundPanel.height * positionPercent]
-            velocity = [-velocity[0], velocity[1]]
-        elif side == LocationToPlayGround.TOP_OUTSIDE:
-            position = [self._playGroundPanel.left + self._playGroundPanel.width * positionPercent, self._playGroundPanel.top - radius]
-            velocity = [velocity[1], velocity[0]]
-        elif side == LocationToPlayGround.BOTTOM_OUTSIDE:
-            position = [self._playGroundPanel.left + self._playGroundPanel.width * positionPercent, self._playGroundPanel.bottom + radius]
-            velocity = [velocity[1], -velocity[0]]
-        return Ball(position, radius, velocity, charactor)
+            self.govern(frameBegin)
+            if self._profiling:
+                self.profiler.end_frame(self.view.tick - lastTick, len(self.view.otherBalls))
+            lastTick = self.view.tick
+        simThread.join()
+        self.view = self.sim
+
+    def simulation_loop(self):
+        # runs on its own thread, ticks on the wall clock and publishes a copy of each finished tick
+        tickInterval = self.sim.tick_interval() / 1000.0
+        nextTick = time.perf_counter() + tickInterval
+        try:
+            while self._running:
+                now = time.perf_counter()
+                if now < nextTick:
+                    time.sleep(nextTick - now)
+                    continue
+                # like the serial loop, a long stall is not caught up
+                nextTick = max(nextTick, now - self._maxFrameTime / 1000.0)
+                self.on_loop()
+                self._frames.back().capture(self.sim, nextTick)
+                self._frames.publish()
+                nextTick += tickInterval
+        finally:
+            self._running = False
     
-    def get_ball_relative_location(self, ball):
-        leftMost = ball.position[0] - ball.radius
-        rightMost = ball.position[0] + ball.radius
-        upMost = ball.position[1] - ball.radius
-        downMost = ball.position[1] + ball.radius
-        if leftMost >= 0.0 and rightMost <= self._playGroundWidth and upMost >= 0.0 and downMost <= self._playGroundHeight:
-            return LocationToPlayGround.INSIDE, None
-        elif rightMost < 0.0 or leftMost > self._playGroundWidth or downMost < 0.0 or upMost > self._playGroundHeight:
-            details = set()
-            if rightMost < 0.0:
-                details.add(LocationToPlayGround.LEFT_OUTSIDE)
-            if leftMost > self._playGroundWidth:
-                details.add(LocationToPlayGround.RIGHT_OUTSIDE)
-            if downMost < 0.0:
-                details.add(LocationToPlayGround.TOP_OUTSIDE)
-            if upMost > self._playGroundHeight:
-                details.add(LocationToPlayGround.BOTTOM_OUTSIDE)
-            return LocationToPlayGround.OUTSIDE, details
+    def interpolate(self):
+        # positions drawn this frame, between the last two simulation ticks
+        store = self.view.otherBalls
+        self._renderSlots = store.alive_slots()
+        self._renderPositions = store.interpolated_positions(self._renderSlots, self._alpha)
+        self._renderHeroPosition = self.view.hero_interpolated_position(self._alpha)
+
+    def render_playground(self, surface=None):
+        # surface: an offscreen target the playground is scaled to fit, the screen by default
+        self.interpolate()
+        if surface is None and self._lowResSurface is not None:
+            # draw at a lower resolution and upscale into the window
+            self.render_playground(self._lowResSurface)
+            playGroundRect = self._playGroundPanel.to_rect()
+            pygame.transform.scale(self._lowResSurface, playGroundRect.size, self.screen.subsurface(playGroundRect))
+            return
+        if surface is None:
+            pygame.draw.rect(self.screen, colors.PLAYGROUND_BGCOLOR, self._playGroundPanel.to_rect())
+            # draw balls
+            self.draw_balls()
+            return
+        panel = self._playGroundPanel
+        scale = min(surface.get_width() / panel.width, surface.get_height() / panel.height)
+        surface.fill(colors.PLAYGROUND_BGCOLOR)
+        self.draw_balls(surface, (panel.left, panel.top), scale)
+
+    def draw_balls(self, surface=None, origin=(0, 0), scale=1.0):
+        if surface is None:
+            surface = self.screen
+        hero = self.view.heroBall
+        heroRadius = int(hero.radius * scale)
+        heroPosition = self._renderHeroPosition
+        heroColor = self.ball_color(hero)
+        heroX = int((heroPosition[0] - origin[0]) * scale)
+        heroY = int((heroPosition[1] - origin[1]) * scale)
+        blitSequence = [(self.sprites.get(heroColor, heroRadius), (heroX - heroRadius, heroY - heroRadius))]
+        store = self.view.otherBalls
+        slots = self._renderSlots
+        if len(slots) > 0:
+            if scale == 1.0 and origin == (0, 0):
+                xs = self._renderPositions[:, 0].astype(int)
+                ys = self._renderPositions[:, 1].astype(int)
+                radii = store.radii[slots].astype(int)
+            else:
+                xs = ((self._renderPositions[:, 0] - origin[0]) * scale).astype(int)
+                ys = ((self._renderPositions[:, 1] - origin[1]) * scale).astype(int)
+                radii = (store.radii[slots] * scale).astype(int)
+            codes = store.charactors[slots].astype(np.int64)
+            # random balls cycle through the special colors instead of drawing from the rng
+            isRandom = codes == Charactor.SPECIAL_RANDOM.value
+            if isRandom.any():
+                codes[isRandom] = self._randomColorCodes[(self._frameCount + store.serials[slots[isRandom]]) % len(self._randomColorCodes)]
+            if self._lod:
+                xs, ys, radii, codes = self.draw_dots(surface, origin, scale, xs, ys, radii, codes)
+            # one sprite lookup per distinct (charactor, radius)
+            keys, inverse = np.unique((codes << 32) | radii, return_inverse=True)
+            keySprites = [self.sprites.get(colors.BALL_COLOR_BY_CODE[key >> 32], key & 0xffffffff) for key in keys.tolist()]
+            blitSequence.extend((keySprites[k], (x - r, y - r)) for k, x, y, r in zip(inverse.tolist(), xs.tolist(), ys.tolist(), radii.tolist()))
+        surface.blits(blitSequence, doreturn=False)
+
+    def draw_dots(self, surface, origin, scale, xs, ys, radii, codes):
+        # level of detail: balls off the playground are dropped and the ones under _lodRadius are drawn
+        # as 3x3 dots in one vectorized write, returns the balls still to be drawn as sprites
+        panel = self._playGroundPanel
+        left = int((panel.left - origin[0]) * scale)
+        top = int((panel.top - origin[1]) * scale)
+        right = int((panel.right - origin[0]) * scale)
+        bottom = int((panel.bottom - origin[1]) * scale)
+        visible = (xs + radii >= left) & (xs - radii < right) & (ys + radii >= top) & (ys - radii < bottom)
+        # a dot never touches the playground border, so it needs no clipping
+        dots = visible & (radii < self._lodRadius) & (xs > left) & (xs < right - 1) & (ys > top) & (ys < bottom - 1)
+        if dots.any():
+            try:
+                pixels = pygame.surfarray.pixels2d(surface)
+            except ValueError:
+                # 24-bit surfaces have no 2d view, their dots stay sprites
+                pixels = None
+            if pixels is not None:
+                pixelFormat = (surface.get_bitsize(), surface.get_masks())
+                if self._dotColors is None or self._dotColors[0] != pixelFormat:
+                    colorByCode = colors.BALL_COLOR_BY_CODE
+                    self._dotColors = (pixelFormat, np.array([surface.map_rgb(colorByCode.get(code, colors.BLACK)) for code in range(max(colorByCode) + 1)], dtype=np.int64))
+                dotColors = self._dotColors[1][codes[dots]]
+                dotXs, dotYs = xs[dots], ys[dots]
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        pixels[dotXs + dx, dotYs + dy] = dotColors
+                del pixels
+            else:
+                dots[:] = False
+        keep = visible & ~dots
+        return xs[keep], ys[keep], radii[keep], codes[keep]
+
+    def ball_color(self, ball):
+        if ball.event is not None:
+            return colors.BALL_COLOR_DICT[ball.event]
+        elif ball.status is not None:
+            return colors.BALL_COLOR_DICT[ball.status]
+        elif ball.charactor == Charactor.SPECIAL_RANDOM:
+            return colors.BALL_COLOR_DICT[random.choice(SPECIAL_CHARACTORS)]
         else:
-            return LocationToPlayGround.CROSSING, None
-    
-    def render_playground(self):
-        pygame.draw.rect(self.screen, colors.PLAYGROUND_BGCOLOR, self._playGroundPanel.to_rect())
-        # draw balls
-        self.draw_ball(self.heroBall)
-        for ball in self.otherBalls:
-            self.draw_ball(ball)
+            return colors.BALL_COLOR_DICT[ball.charactor]
+
+    def update_scoreboard(self):
+        # bind current values, returns the labels whose text changed
+        labels = self.scoreBoardLabels
+        changed = list()
+        for name, value in (('level', self.view.gameLevel),
+                            ('scoreTitle', None),
+                            ('score', round(self.view.score, 1)),
+                            ('radius', self.view.heroBall.radius),
+                            ('velocity', self.view.heroBall.velocity),
+                            ('statusTitle', None),
+                            ('quality', self.governor.quality.name)):
+            if labels[name].set(value):
+                changed.append(labels[name])
+        return changed
 
     def render_scoreboard(self):
         # draw scoreboard
         pygame.draw.rect(self.screen, colors.SCOREBOARD_BGCOLOR, self._scoreBoardPanel.to_rect())
-        myfont = pygame.font.SysFont('Calibri', 30)
-        textsurf = myfont.render(f'Level : {self.gameLevel}', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.02, 0.0))
-        textsurf = myfont.render(f'Score : ', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.02, 0.24))
-        textsurf = myfont.render(f'{self.score:.1f}', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.1, 0.4))
-        # baisc info
-        textsurf = myfont.render(f'Radius : {self.heroBall.radius}', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.02, 0.5))
-        textsurf = myfont.render(f'Velocity : {self.heroBall.velocity}', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.02, 0.6))
-        # status
-        textsurf = myfont.render(f'Status', False, colors.BLACK)
-        self.screen.blit(textsurf, self._scoreBoardPanel.get_coord_by_percent(0.02, 0.7))
-        if self.heroBall.status is not None:
+        self.update_scoreboard()
+        for label in self.scoreBoardLabels.values():
+            label.draw(self.screen)
+        self.draw_status()
+        if self.profiler.enabled:
+            self.profiler.draw(self.screen, self._profilerRect, 1000 / self._clockTickNumber)
+
+    def dump_profile(self):
+        stem = self._appDir / time.strftime('profile-%Y%m%d-%H%M%S')
+        self.profiler.dump(stem.with_suffix('.csv'))
+        self.profiler.dump(stem.with_suffix('.json'))
+
+    def draw_status(self):
+        self._prevStatus = self.view.heroBall.status
+        if self.view.heroBall.status is not None:
             width = self._scoreBoardPanel.width * 0.8
             height = self._scoreBoardPanel.width * 0.1
 
-            if self.heroBall.status == Charactor.SPECIAL_GODLIKE:
-                width *= (1.0 - (pygame.time.get_ticks() - self.heroBall.statusBeginTick) / (self._statusGodlikePeriod))
+            if self.view.heroBall.status == Charactor.SPECIAL_GODLIKE:
+                width *= (1.0 - (self.view.get_ticks() - self.view.heroBall.statusBeginTick) / (self.sim._statusGodlikePeriod))
                 self.screen.blit(self.imgs['statusGodlike'], self._scoreBoardPanel.get_coord_by_percent(0.5, 0.69))
-            elif self.heroBall.status == Charactor.SPECIAL_FROZEN:
-                width *= (1.0 - (pygame.time.get_ticks() - self.heroBall.statusBeginTick) / (self._statusFrozenPeriod))
+            elif self.view.heroBall.status == Charactor.SPECIAL_FROZEN:
+                width *= (1.0 - (self.view.get_ticks() - self.view.heroBall.statusBeginTick) / (self.sim._statusFrozenPeriod))
                 self.screen.blit(self.imgs['statusFrozen'], self._scoreBoardPanel.get_coord_by_percent(0.5, 0.69))
 
-            pygame.draw.rect(self.screen, colors.BALL_COLOR_DICT[self.heroBall.status], Rect(*self._scoreBoardPanel.get_coord_by_percent(0.1, 0.8), width, height))
+            pygame.draw.rect(self.screen, colors.BALL_COLOR_DICT[self.view.heroBall.status], Rect(*self._scoreBoardPanel.get_coord_by_percent(0.1, 0.8), width, height))
 
     def render_gameOver(self):
-        # update record
-        newRecFlag = False
-        if self.score > self.scoreRecord and self.score > 0.0:
-            with open(self._appDir / self._recordFileName, 'w') as recf:
-                print('%d' % self.gameLevel, file=recf)
-                print('%.1f' % self.score, file=recf)
-            newRecFlag = True
+        # keep the result, written in the background; a replay is a game already kept
+        if self._replay is None:
+            self.scores.add(result_row(self.sim, 'game'))
+        newRecFlag = self.sim.score > self.scoreRecord and self.sim.score > 0.0
 
         # render
         self.screen.fill(colors.GAMEOVER_BGCOLOR)
-        myfont = pygame.font.SysFont('Calibri', 50)
-        textsurf = myfont.render(f'Your Final Level: {self.gameLevel}', False, colors.BLACK)
+        myfont = self.textCache.get_font('Calibri', 50)
+        textsurf = self.textCache.render(myfont, f'Your Final Level: {self.sim.gameLevel}', colors.BLACK)
         self.screen.blit(textsurf, (self._screenWidth * 0.16, self._screenHeight * 0.2))
-        textsurf = myfont.render(f'Your Final Score: {self.score:.1f}', False, colors.BLACK)
+        textsurf = self.textCache.render(myfont, f'Your Final Score: {self.sim.score:.1f}', colors.BLACK)
         self.screen.blit(textsurf, (self._screenWidth * 0.16, self._screenHeight * 0.4))
 
         if newRecFlag:
-            textsurf = myfont.render(f'New Record!', False, colors.BLACK)
+            textsurf = self.textCache.render(myfont, f'New Record!', colors.BLACK)
         else:
-            textsurf = myfont.render(f'Best Score Record: {self.scoreRecord}', False, colors.BLACK)
+            textsurf = self.textCache.render(myfont, f'Best Score Record: {self.scoreRecord:.1f}', colors.BLACK)
         self.screen.blit(textsurf, (self._screenWidth * 0.16, self._screenHeight * 0.6))
 
-        textsurf = myfont.render(f'Press Enter to Exit', False, colors.BLACK)
+        textsurf = self.textCache.render(myfont, f'Press Enter to Exit', colors.BLACK)
         self.screen.blit(textsurf, (self._screenWidth * 0.16, self._screenHeight * 0.8))
         # update display
         pygame.display.update()
@@ -373,62 +601,17 @@ class App:
             elif event.type == KEYDOWN and event.key not in (K_DOWN, K_UP, K_LEFT, K_RIGHT, K_w, K_s, K_a, K_d):
                 break
 
-    def draw_ball(self, ball):
-        if ball.event is not None:
-            color = colors.BALL_COLOR_DICT[ball.event]
-        elif ball.status is not None:
-            color = colors.BALL_COLOR_DICT[ball.status]
-        elif ball.charactor == Charactor.SPECIAL_RANDOM:
-            color = colors.BALL_COLOR_DICT[random.choice(SPECIAL_CHARACTORS)]
-        else:
-            color = colors.BALL_COLOR_DICT[ball.charactor]
-        pygame.draw.circle(self.screen, color, [int(x) for x in ball.position], int(ball.radius))
-    
-    def levelUp(self):
-        self.gameLevel += 1
-        self._genBallInterval *= self._levelUpGenBallIntervalRatio
-        self._initialVelocityMagnitudeRange = tuple(x * self._levelUpVelocityRatio for x in self._initialVelocityMagnitudeRange)
-        self._initialRadiusRange = tuple(x * self._levelUpRadiusRatio for x in self._initialRadiusRange)
-    
-    def collid_handler(self, ball):
-        if ball.charactor == Charactor.ENEMY:
-            if self.heroBall.status != Charactor.SPECIAL_GODLIKE:
-                self._running = False
-        else:
-            # resolve random
-            if ball.charactor == Charactor.SPECIAL_RANDOM:
-                ball.charactor = random.choice(SPECIAL_CHARACTORS)
-            # apply 
-            self.heroBall.event = ball.charactor
-            if ball.charactor == Charactor.SPECIAL_BIGGER:
-                if self.heroBall.radius > self._heroBallRadiusRange[0]:
-                    self.heroBall.radius += 1
-            elif ball.charactor == Charactor.SPECIAL_SMALLER:
-                if self.heroBall.radius < self._heroBallRadiusRange[1]:
-                    self.heroBall.radius -= 1
-            elif ball.charactor == Charactor.SPECIAL_SPEED_UP:
-                if self.heroBall.velocity < self._heroBallVelocityRange[1]:
-                    self.heroBall.velocity += 1
-            elif ball.charactor == Charactor.SPECIAL_SPEED_DOWN:
-                if self.heroBall.velocity > self._heroBallVelocityRange[0]:
-                    self.heroBall.velocity -= 1
-            elif ball.charactor == Charactor.SPECIAL_GODLIKE:
-                self.heroBall.status = Charactor.SPECIAL_GODLIKE
-                self.heroBall.statusBeginTick = pygame.time.get_ticks()
-                set_timer(self._SPECIAL_GODLIKE_EXPIRE, self._statusGodlikePeriod - 1)
-            elif ball.charactor == Charactor.SPECIAL_FROZEN:
-                self.heroBall.status = Charactor.SPECIAL_FROZEN
-                self.heroBall.statusBeginTick = pygame.time.get_ticks()
-                set_timer(self._SPECIAL_FROZEN_EXPIRE, self._statusFrozenPeriod - 1)
-    
-    def scoreUp(self, balls, collide):
-        basePoint = math.sqrt(self.gameLevel)
-        if not collide:
-            self.score += basePoint * len(balls)
-        else:
-            for ball in balls:
-                self.score += basePoint * self._collideScoreCoef[ball.charactor]
-    
 if __name__ == "__main__" :
-    theApp = App()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=None, help='seed of the game, random by default')
+    parser.add_argument('--record', default=None, help='save the key input of this game as a replay')
+    parser.add_argument('--replay', default=None, help='play back a recorded replay')
+    parser.add_argument('--pipelined', action='store_true', help='simulate on a separate thread from rendering')
+    parser.add_argument('--startup-report', action='store_true', help='print how long each startup phase took')
+    parser.add_argument('--rewind', action='store_true', help='hold backspace to rewind the last seconds of the game')
+    parser.add_argument('--dirty-rects', action='store_true', help='only redraw the parts of the screen that changed')
+    parser.add_argument('--fixed-quality', action='store_true', help='always draw at full quality, however slow the frames get')
+    args = parser.parse_args()
+    theApp = App(seed=args.seed, recordPath=args.record, replayPath=args.replay, pipelined=args.pipelined, startupReport=args.startup_report, fixedQuality=args.fixed_quality, dirtyRects=args.dirty_rects, rewind=args.rewind)
     theApp.on_execute()
@@ -0,0 +1,293 @@
+# gym-style environment stepping K independent games in lockstep on shared arrays
+#   env = VecBallEnv(64)
+#   obs = env.reset(seed=0)
+#   obs, rewards, dones, info = env.step(actions)    actions: (K, 2) ints in {-1, 0, 1}, (moveUpDown, moveLeftRight)
+
+import math
+import random
+import numpy as np
+from ball import Charactor, SPECIAL_CHARACTORS
+from simulation import Simulation, SEED_MASK
+
+NO_STATUS = 0
+BALL_FEATURES = ('dx', 'dy', 'vx', 'vy', 'radius', 'charactor')
+HERO_FEATURES = ('x', 'y', 'radius', 'velocity', 'status')
+
+
+class VecBallEnv:
+    # the rules of Simulation on (K, maxBalls) arrays, spawns and collision effects loop only over the games they happen in
+    def __init__(self, numEnvs, maxBalls=512, nearestBalls=16, overrides=None, maxTicks=None, playGroundPanel=None):
+        self.numEnvs = numEnvs
+        self.maxBalls = maxBalls
+        self.nearestBalls = nearestBalls
+        self.maxTicks = maxTicks
+        # a template simulation holds the config and draws spawn parameters
+        self.sim = Simulation(playGroundPanel)
+        if overrides:
+            self.sim.apply_config(overrides)
+        self.sim.reset(seed=0)
+        self.panel = self.sim._playGroundPanel
+        self._stepScale = self.sim._referenceTickRate / self.sim._tickRate
+        self._collideScoreCoef = {charactor.value : coef for charactor, coef in self.sim._collideScoreCoef.items()}
+
+        K, M = numEnvs, maxBalls
+        # games
+        self.tick = np.zeros(K, dtype=np.int64)
+        self.running = np.ones(K, dtype=bool)
+        self.gameLevel = np.ones(K, dtype=np.int64)
+        self.score = np.zeros(K, dtype=np.float64)
+        self.seeds = np.zeros(K, dtype=np.uint64)
+        self.genBallInterval = np.zeros(K, dtype=np.float64)
+        self.velocityMagnitudeRange = np.zeros((K, 2), dtype=np.float64)
+        self.radiusRange = np.zeros((K, 2), dtype=np.float64)
+        self.nextGenBallTick = np.zeros(K, dtype=np.int64)
+        self.rngs = [None] * K
+        self.toAddQueues = [list() for _ in range(K)]
+        # heroes
+        self.heroPosition = np.zeros((K, 2), dtype=np.float64)
+        self.heroRadius = np.zeros(K, dtype=np.float64)
+        self.heroVelocity = np.zeros(K, dtype=np.float64)
+        self.heroStatus = np.zeros(K, dtype=np.int8)
+        self.heroStatusBeginTick = np.zeros(K, dtype=np.int64)
+        # balls, slots [0, size) in insertion order like BallStore
+        self.positions = np.zeros((K, M, 2), dtype=np.float64)
+        self.velocities = np.zeros((K, M, 2), dtype=np.float64)
+        self.radii = np.zeros((K, M), dtype=np.float64)
+        self.charactors = np.zeros((K, M), dtype=np.int8)
+        self.alive = np.zeros((K, M), dtype=bool)
+        self.size = np.zeros(K, dtype=np.int64)
+        self._seedSource = random.Random()
+
+    def reset(self, seed=None):
+        # seed: None, an int (game k gets seed + k) or one seed per game
+        if seed is None:
+            seeds = [self._seedSource.getrandbits(32) for _ in range(self.numEnvs)]
+        elif np.isscalar(seed):
+            seeds = [int(seed) + k for k in range(self.numEnvs)]
+            self._seedSource.seed(int(seed))
+        else:
+            seeds = [int(s) for s in seed]
+        for k, s in enumerate(seeds):
+            self.reset_env(k, s)
+        return self.observe()
+
+    def reset_env(self, k, seed):
+        sim = self.sim
+        seed &= SEED_MASK
+        self.seeds[k] = seed
+        self.rngs[k] = random.Random(seed)
+        self.tick[k] = 0
+        self.running[k] = True
+        self.gameLevel[k] = 1
+        self.score[k] = 0.0
+        self.genBallInterval[k] = sim._genBallInterval
+        self.velocityMagnitudeRange[k] = sim._initialVelocityMagnitudeRange
+        self.radiusRange[k] = sim._initialRadiusRange
+        self.toAddQueues[k] = list()
+        self.heroPosition[k] = self.panel.get_coord_by_percent(0.5, 0.5)
+        self.heroRadius[k] = sim._initialHeroRadius
+        self.heroVelocity[k] = sim._initialHeroVelocity
+        self.heroStatus[k] = NO_STATUS
+        self.alive[k] = False
+        self.size[k] = 0
+        self.nextGenBallTick[k] = self.ms_to_ticks(self.gen_ball_interval(k))
+
+    def ms_to_ticks(self, ms):
+        return max(1, round(ms * self.sim._tickRate / 1000))
+
+    def get_ticks(self):
+        return self.tick * 1000 // self.sim._tickRate
+
+    def gen_ball_interval(self, k):
+        return int(float(self.genBallInterval[k]) * max(0.0, self.rngs[k].gauss(1.0, self.sim._genBallStdDev)))
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.numEnvs, 2)
+        prevScore = self.score.copy()
+        self.tick += 1
+        self.on_timers()
+        self.on_loop(actions)
+        rewards = self.score - prevScore
+        dones = ~self.running
+        if self.maxTicks is not None:
+            dones |= self.tick >= self.maxTicks
+        info = {
+            'gameOver' : ~self.running,
+            'finalScore' : np.where(dones, self.score, 0.0),
+            'finalLevel' : np.where(dones, self.gameLevel, 0),
+            'finalTicks' : np.where(dones, self.tick, 0),
+        }
+        # finished games restart right away with a fresh seed
+        for k in np.flatnonzero(dones).tolist():
+            self.reset_env(k, self._seedSource.getrandbits(32))
+        return self.observe(), rewards, dones, info
+
+    def on_timers(self):
+        sim = self.sim
+        # generate balls
+        for k in np.flatnonzero(self.tick >= self.nextGenBallTick).tolist():
+            rng = self.rngs[k]
+            queue = self.toAddQueues[k]
+            if len(queue) == 0:
+                queue = self.toAddQueues[k] = sim.draw_spawns(rng, sim._toAddBatchSize)
+            spawn = queue.pop()
+            position, radius, velocity = sim.place_ball(spawn, self.velocityMagnitudeRange[k].tolist(), self.radiusRange[k].tolist())
+            self.add_ball(k, position, radius, velocity, spawn[0])
+            self.nextGenBallTick[k] = self.tick[k] + self.ms_to_ticks(self.gen_ball_interval(k))
+        # status expire
+        ms = self.get_ticks()
+        elapsed = ms - self.heroStatusBeginTick
+        expired = (self.heroStatus == Charactor.SPECIAL_GODLIKE.value) & (elapsed >= sim._statusGodlikePeriod)
+        expired |= (self.heroStatus == Charactor.SPECIAL_FROZEN.value) & (elapsed >= sim._statusFrozenPeriod)
+        self.heroStatus[expired] = NO_STATUS
+
+    def add_ball(self, k, position, radius, velocity, charactor):
+        if self.size[k] == self.maxBalls:
+            # stable compaction keeps insertion order, a full game drops the spawn
+            keep = np.flatnonzero(self.alive[k])
+            n = len(keep)
+            if n == self.maxBalls:
+                return None
+            for array in (self.positions, self.velocities, self.radii, self.charactors):
+                array[k, :n] = array[k, keep]
+            self.alive[k, :n] = True
+            self.alive[k, n:] = False
+            self.size[k] = n
+        slot = self.size[k]
+        self.positions[k, slot] = position
+        self.velocities[k, slot] = velocity
+        self.radii[k, slot] = radius
+        self.charactors[k, slot] = charactor.value
+        self.alive[k, slot] = True
+        self.size[k] += 1
+        return slot
+
+    def on_loop(self, actions):
+        sim = self.sim
+        panel = self.panel
+        # heroes
+        moveUpDown = actions[:, 0]
+        moveLeftRight = actions[:, 1]
+        velocity = np.where((moveUpDown != 0) & (moveLeftRight != 0), self.heroVelocity / math.sqrt(2.0), self.heroVelocity)
+        velocity = np.where((moveUpDown == 0) & (moveLeftRight == 0), 0.0, velocity) * self._stepScale
+        moving = (velocity > 0.0) & (self.heroStatus != Charactor.SPECIAL_FROZEN.value)
+        heroStart = self.heroPosition.copy()
+        if moving.any():
+            x = self.heroPosition[:, 0] + moveLeftRight * velocity
+            y = self.heroPosition[:, 1] + moveUpDown * velocity
+            x = np.maximum(panel.left + self.heroRadius, np.minimum(panel.right - self.heroRadius, x))
+            y = np.maximum(panel.top + self.heroRadius, np.minimum(panel.bottom - self.heroRadius, y))
+            self.heroPosition[:, 0] = np.where(moving, x, self.heroPosition[:, 0])
+            self.heroPosition[:, 1] = np.where(moving, y, self.heroPosition[:, 1])
+
+        # other balls, only the slot range any game uses
+        m = int(self.size.max())
+        alive = self.alive[:, :m]
+        start = self.positions[:, :m].copy()
+        if self._stepScale == 1.0:
+            self.positions[:, :m] += self.velocities[:, :m]
+        else:
+            self.positions[:, :m] += self.velocities[:, :m] * self._stepScale
+        x, y = self.positions[:, :m, 0], self.positions[:, :m, 1]
+        vx, vy = self.velocities[:, :m, 0], self.velocities[:, :m, 1]
+        r = self.radii[:, :m]
+        outside = (x + r < panel.left) & (vx < 0.0)
+        outside |= (x - r > panel.right) & (vx > 0.0)
+        outside |= (y + r < panel.top) & (vy < 0.0)
+        outside |= (y - r > panel.bottom) & (vy > 0.0)
+        outside &= alive
+        dx = x - self.heroPosition[:, 0, None]
+        dy = y - self.heroPosition[:, 1, None]
+        reach = r + self.heroRadius[:, None]
+        collide = dx * dx + dy * dy < reach * reach
+        if sim._continuousCollision:
+            # closest approach over the tick, as BallStore.sweep_mask
+            px = start[:, :, 0] - heroStart[:, 0, None]
+            py = start[:, :, 1] - heroStart[:, 1, None]
+            ux = x - start[:, :, 0] - (self.heroPosition[:, 0, None] - heroStart[:, 0, None])
+            uy = y - start[:, :, 1] - (self.heroPosition[:, 1, None] - heroStart[:, 1, None])
+            uu = ux * ux + uy * uy
+            t = np.clip(-(px * ux + py * uy) / np.where(uu > 0.0, uu, 1.0), 0.0, 1.0)
+            px += t * ux
+            py += t * uy
+            collide |= px * px + py * py < reach * reach
+        collide &= alive
+        outside &= ~collide
+
+        # collision effects, in slot order like Simulation
+        basePoint = np.sqrt(self.gameLevel)
+        collidedEnvs = np.flatnonzero(collide.any(axis=1)).tolist()
+        collided = {k : [self.collid_handler(k, code) for code in self.charactors[k, :m][collide[k]].tolist()] for k in collidedEnvs}
+        # scoring
+        outsideCount = outside.sum(axis=1)
+        self.score += np.where(outsideCount > 0, basePoint * outsideCount, 0.0)
+        for k, codes in collided.items():
+            for code in codes:
+                self.score[k] += basePoint[k] * self._collideScoreCoef[code]
+        alive &= ~(outside | collide)
+        # trim trailing dead slots so the active range stays short
+        if m > 0:
+            anyAlive = alive.any(axis=1)
+            self.size = np.where(anyAlive, m - np.argmax(alive[:, ::-1], axis=1), 0)
+
+        # level up
+        # like the level-up timer of Simulation, a game that ended this tick stays at its level
+        levelUp = (self.get_ticks() // sim._levelUpTimeInterval > self.gameLevel) & self.running
+        if levelUp.any():
+            self.gameLevel[levelUp] += 1
+            self.genBallInterval[levelUp] *= sim._levelUpGenBallIntervalRatio
+            self.velocityMagnitudeRange[levelUp] *= sim._levelUpVelocityRatio
+            self.radiusRange[levelUp] *= sim._levelUpRadiusRatio
+
+    def collid_handler(self, k, code):
+        sim = self.sim
+        charactor = Charactor(code)
+        if charactor == Charactor.ENEMY:
+            if self.heroStatus[k] != Charactor.SPECIAL_GODLIKE.value:
+                self.running[k] = False
+        else:
+            if charactor == Charactor.SPECIAL_RANDOM:
+                charactor = self.rngs[k].choice(SPECIAL_CHARACTORS)
+            if charactor == Charactor.SPECIAL_BIGGER:
+                if self.heroRadius[k] > sim._heroBallRadiusRange[0]:
+                    self.heroRadius[k] += 1
+            elif charactor == Charactor.SPECIAL_SMALLER:
+                if self.heroRadius[k] < sim._heroBallRadiusRange[1]:
+                    self.heroRadius[k] -= 1
+            elif charactor == Charactor.SPECIAL_SPEED_UP:
+                if self.heroVelocity[k] < sim._heroBallVelocityRange[1]:
+                    self.heroVelocity[k] += 1
+            elif charactor == Charactor.SPECIAL_SPEED_DOWN:
+                if self.heroVelocity[k] > sim._heroBallVelocityRange[0]:
+                    self.heroVelocity[k] -= 1
+            elif charactor in (Charactor.SPECIAL_GODLIKE, Charactor.SPECIAL_FROZEN):
+                self.heroStatus[k] = charactor.value
+                self.heroStatusBeginTick[k] = self.tick[k] * 1000 // sim._tickRate
+        return charactor.value
+
+    def observe(self):
+        # hero: (K, 5) HERO_FEATURES, balls: (K, nearestBalls, 6) BALL_FEATURES of the nearest balls, zero padded
+        K, N = self.numEnvs, self.nearestBalls
+        hero = np.stack((self.heroPosition[:, 0], self.heroPosition[:, 1], self.heroRadius, self.heroVelocity, self.heroStatus.astype(np.float64)), axis=1).astype(np.float32)
+        balls = np.zeros((K, N, len(BALL_FEATURES)), dtype=np.float32)
+        m = int(self.size.max())
+        n = min(N, m)
+        if n == 0:
+            return {'hero' : hero, 'balls' : balls}
+        offsets = self.positions[:, :m] - self.heroPosition[:, None, :]
+        dx, dy = offsets[:, :, 0], offsets[:, :, 1]
+        distance2 = np.where(self.alive[:, :m], dx * dx + dy * dy, np.inf)
+        if n < m:
+            nearest = np.argpartition(distance2, n - 1, axis=1)[:, :n]
+        else:
+            nearest = np.broadcast_to(np.arange(m), (K, m))
+        order = np.argsort(np.take_along_axis(distance2, nearest, axis=1), axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        rows = np.arange(K)[:, None]
+        present = self.alive[rows, nearest]
+        balls[:, :n, 0:2] = offsets[rows, nearest]
+        balls[:, :n, 2:4] = self.velocities[rows, nearest]
+        balls[:, :n, 4] = self.radii[rows, nearest]
+        balls[:, :n, 5] = self.charactors[rows, nearest]
+        balls[:, :n][~present] = 0.0
+        return {'hero' : hero, 'balls' : balls}